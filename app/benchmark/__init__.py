@@ -0,0 +1,6 @@
+from app.benchmark.instances import random_params
+
+
+__all__ = [
+    "random_params"
+]
@@ -0,0 +1,85 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.benchmark.instances import random_params
+from app.model.Model import Model
+from app.model.feasibility import feasible_tuples
+from app.model.matrix import MatrixModel
+
+
+def build_pulp(model: Model, params: dict, path: str) -> dict:
+    prob, _ = model.build(params)
+    prob.writeMPS(path)
+
+    return {
+        "variables": prob.numVariables(),
+        "constraints": prob.numConstraints(),
+    }
+
+def build_matrix(model: Model, params: dict, path: str) -> dict:
+    tuples = feasible_tuples(params)
+
+    # INFO: Model.build also computes the warm start, keep both sides doing the same work.
+    model.warm_start(params, tuples)
+
+    matrix = MatrixModel(params, tuples, location=model.location)
+    matrix.write_mps(path)
+
+    return {
+        "variables": matrix.n_columns,
+        "constraints": matrix.n_rows,
+    }
+
+def run(params: dict, builder: str, location: str) -> dict:
+    model = Model(logger=logging.getLogger(), location=location, builder=builder)
+
+    build = build_matrix if builder == "matrix" else build_pulp
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "model.mps")
+
+        start = time.perf_counter()
+        result = build(model, params, path)
+        build_time = time.perf_counter() - start
+
+        mps_size = os.path.getsize(path)
+
+        # INFO: tracemalloc slows every allocation down, so memory is measured on a second run.
+        tracemalloc.start()
+        build(model, params, path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "builder": builder,
+        "location": location,
+        "patients": len(params['patientes']),
+        **result,
+        "build_time": build_time,
+        "peak_memory": peak,
+        "mps_size": mps_size,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare building and writing the MIP with PuLP objects and with index arrays.")
+    parser.add_argument("--doctors", type=int, default=30)
+    parser.add_argument("--patients", type=int, nargs="+", default=[ 100, 300, 1000 ])
+    parser.add_argument("--locals", type=int, default=4)
+    parser.add_argument("--location", choices=[ "pairwise", "indicator" ], default="indicator")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    for n_patients in args.patients:
+        params = random_params(doctors=args.doctors, patients=n_patients, locals_=args.locals, seed=args.seed)
+
+        for builder in ("pulp", "matrix"):
+            print(json.dumps(run(params, builder, args.location)), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+
+from app.benchmark.instances import random_params
+from app.model.Model import Model
+from app.model.aggregation import aggregate_params, patient_classes
+from app.model.feasibility import check_solution, feasible_tuples
+from app.model.instance import subset_params
+
+
+def repeated_params(doctors: int, profiles: int, repeats: int, locals_: int, seed: int) -> dict:
+    # INFO: `repeats` identical patients of each of `profiles` random ones, as a group sharing the same afternoons.
+    params = random_params(doctors=doctors, patients=profiles, locals_=locals_, seed=seed)
+
+    return subset_params(params, np.arange(doctors), np.repeat(np.arange(profiles), repeats))
+
+def run(params: dict, aggregate: bool, time_limit: float | None) -> dict:
+    model = Model(logger=logging.getLogger(), aggregate=aggregate, backend="cbc", profile={ "time_limit": time_limit })
+
+    class_of = patient_classes(params)
+    solved = aggregate_params(params, class_of) if aggregate else params
+
+    start = time.perf_counter()
+    solution, status, _ = model.optimze(params)
+    solve_time = time.perf_counter() - start
+
+    return {
+        "aggregate": aggregate,
+        "patients": len(params['patientes']),
+        "classes": int(class_of.max(initial=-1) + 1),
+        "variables": len(feasible_tuples(solved)),
+        "status": status,
+        "objective": len(solution),
+        "bound": model.stats.get("bound"),
+        "nodes": model.stats.get("nodes"),
+        "valid": not check_solution(params, solution),
+        "solve_time": solve_time,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve time with and without grouping interchangeable patients.")
+    parser.add_argument("--doctors", type=int, default=30)
+    parser.add_argument("--profiles", type=int, default=100)
+    parser.add_argument("--repeats", type=int, nargs="+", default=[ 1, 5, 20 ])
+    parser.add_argument("--locals", type=int, default=4)
+    parser.add_argument("--time-limit", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    for repeats in args.repeats:
+        params = repeated_params(args.doctors, args.profiles, repeats, args.locals, args.seed)
+
+        for aggregate in (False, True):
+            print(json.dumps(run(params, aggregate, args.time_limit)), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.loader.Loader import Loader, INPUT_SHEETS
+
+
+# INFO: Row-by-row implementation that Loader.load_data used before, kept as the reference.
+def legacy_duplicates(loader: Loader, data: dict) -> dict:
+
+    def before_verify_duplicate(data: pd.DataFrame, column_name: str):
+        current_name = None
+        idx = 0
+        new_column = []
+        for _, row in data.iterrows():
+            if row[column_name] != 0:
+                current_name = row[column_name]
+                idx = 0
+                new_column.append(current_name)
+            else:
+                new_column.append(current_name + "#" + str(idx))
+                idx += 1
+
+        data[column_name] = new_column
+
+        return data
+
+    def verify_duplicate(data: pd.DataFrame, sheet_name: str, column_name: str):
+        if column_name not in data.columns:
+            return data
+
+        duplicated = data[column_name][data[column_name].duplicated(keep=False)]
+
+        data = data.drop_duplicates(subset=column_name, keep="first")
+
+        for name in duplicated.unique():
+            if "#" in name:
+                continue
+            loader.warning_message(
+                sheet_name,
+                f"{column_name.capitalize()} {name} duplicado na tabela. Considerado apenas o primeiro."
+            )
+
+        return data
+
+    def after_verify_duplicate(data: pd.DataFrame, column_name: str):
+        new_column = []
+        for _, row in data.iterrows():
+            if "#" in row[column_name]:
+                new_column.append(0)
+            else:
+                new_column.append(row[column_name])
+
+        data[column_name] = new_column
+
+        return data
+
+    for sheet_name, sheet_data in data.items():
+        column_name = 'paciente' if 'Paciente' in sheet_name else 'profissional'
+        data[sheet_name] = before_verify_duplicate(sheet_data, column_name)
+        data[sheet_name] = verify_duplicate(data[sheet_name], sheet_name, column_name)
+        data[sheet_name] = after_verify_duplicate(sheet_data, column_name)
+
+    return data
+
+def vectorized_duplicates(loader: Loader, data: dict) -> dict:
+    for sheet_name, sheet_data in data.items():
+        column_name = 'paciente' if 'Paciente' in sheet_name else 'profissional'
+
+        names = loader.before_verify_duplicate(sheet_data, column_name)
+        loader.verify_duplicate(names, sheet_name, column_name)
+        data[sheet_name] = loader.after_verify_duplicate(sheet_data, names, column_name)
+
+    return data
+
+def random_sheets(rows: int, duplicates: float = 0.01, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+
+    data = dict()
+
+    for sheet_name, group in (("DisponPaciente", 6), ("IdadePaciente", 1), ("DisponProfissional", 6)):
+        column_name = 'paciente' if 'Paciente' in sheet_name else 'profissional'
+
+        n_names = rows // group
+        names = np.array([ f"{column_name}_{i}" for i in range(n_names) ], dtype=object)
+
+        # INFO: Repeated names, and a few names that already contain "#".
+        repeated = rng.random(n_names) < duplicates
+        names[repeated] = names[rng.integers(0, n_names, repeated.sum())]
+        names[rng.random(n_names) < duplicates] = "nome#especial"
+
+        column = np.zeros(n_names * group, dtype=object)
+        column[::group] = names
+
+        data[sheet_name] = pd.DataFrame({
+            column_name: column,
+            "valor": rng.integers(0, 2, len(column)),
+        })
+
+    return data
+
+def compare(data: dict) -> dict:
+    legacy_loader, loader = Loader(), Loader()
+
+    start = time.perf_counter()
+    legacy = legacy_duplicates(legacy_loader, { k: v.copy() for k, v in data.items() })
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = vectorized_duplicates(loader, { k: v.copy() for k, v in data.items() })
+    vectorized_time = time.perf_counter() - start
+
+    same_data = all(legacy[k].equals(result[k]) for k in data)
+
+    return {
+        "rows": sum(len(v) for v in data.values()),
+        "warnings": len(loader.errors),
+        "identical": same_data and legacy_loader.errors == loader.errors,
+        "legacy_time": legacy_time,
+        "vectorized_time": vectorized_time,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the vectorized duplicate handling of the Loader against the row-by-row one.")
+    parser.add_argument("files", nargs="*", help="Workbooks checked besides the generated tables.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[ 1000, 10000, 60000 ])
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    results = [ compare(random_sheets(rows, seed=args.seed)) for rows in args.rows ]
+
+    for file_path in args.files:
+        sheets = pd.read_excel(file_path, sheet_name=INPUT_SHEETS)
+        results.append({ "file": file_path, **compare({ k: v.fillna(0) for k, v in sheets.items() }) })
+
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    return 0 if all(result["identical"] for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
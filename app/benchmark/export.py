@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import openpyxl
+
+from app.benchmark.schedule import random_schedule
+from app.export import export_formats, open_session
+
+
+def random_response(doctors: int, seed: int = 0) -> tuple[dict, np.ndarray]:
+    solution, map_local, map_patient, map_professionals = random_schedule(doctors, seed=seed)
+
+    rng = np.random.default_rng(seed)
+
+    response = {
+        "doctor_names": map_professionals,
+        "patient_names": map_patient,
+        "local_names": map_local,
+        "local_m_l": rng.integers(0, 2, (doctors, len(map_local))),
+    }
+
+    return response, solution
+
+def export(export_format: str, directory: str, response: dict, solution: np.ndarray) -> float:
+    file_path = os.path.join(directory, f"{export_format}.xlsx")
+    openpyxl.Workbook().save(file_path)
+
+    start = time.perf_counter()
+
+    session = open_session(file_path, export_format=export_format, stream_schedule=False)
+    session.clear_output()
+    session.write_output(response, solution)
+    session.write_errors(list())
+    session.save()
+
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Time of each export format for the same solution.")
+    parser.add_argument("--doctors", type=int, nargs="+", default=[ 50, 200, 1000 ])
+    parser.add_argument("--formats", nargs="+", choices=export_formats(), default=export_formats())
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    for doctors in args.doctors:
+        response, solution = random_response(doctors, seed=args.seed)
+
+        result = { "doctors": doctors, "appointments": len(solution) }
+
+        with tempfile.TemporaryDirectory() as directory:
+            for export_format in args.formats:
+                result[f"{export_format}_time"] = export(export_format, directory, response, solution)
+
+        print(json.dumps(result), flush=True)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
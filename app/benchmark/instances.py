@@ -0,0 +1,40 @@
+import numpy as np
+
+from app.loader.Loader import HOUR_PER_DAY, WEEK_SIZE
+
+
+def random_params(
+        doctors: int = 10,
+        patients: int = 60,
+        locals_: int = 3,
+        density: float = 0.4,
+        seed: int = 0
+    ) -> dict:
+    rng = np.random.default_rng(seed)
+
+    ages = rng.integers(3, 70, size=patients)
+    rules = rng.integers(0, 2, size=(doctors, 3))
+
+    # INFO: Same age buckets as Loader.create_competence_m_p.
+    buckets = np.stack([ ages < 12, (12 <= ages) & (ages < 18), 18 <= ages ], axis=1)
+
+    local_m_l = (rng.random(size=(doctors, locals_)) < 0.6).astype(float)
+    local_p_l_d = (rng.random(size=(patients, locals_, WEEK_SIZE)) < 0.5).astype(float)
+    local_p_l_d[ages < 12, 0, :] = 0
+
+    return {
+        'days': np.arange(WEEK_SIZE),
+        'hours': np.arange(HOUR_PER_DAY),
+        'doctors': np.arange(doctors),
+        'doctor_names': { i: f"prof_{i}" for i in range(doctors) },
+        'patientes': np.arange(patients),
+        'patient_names': { i: f"pac_{i}" for i in range(patients) },
+        'locals': np.arange(locals_),
+        'local_names': { i: "virtual_epsi" if i == 0 else f"unidade_{i}" for i in range(locals_) },
+        'disp_m': rng.integers(0, 11, size=doctors).astype(float),
+        'competence_m_p': (rules @ buckets.T.astype(int) > 0).astype(float),
+        'local_m_l': local_m_l,
+        'local_p_l_d': local_p_l_d,
+        'dispon_p_d_h': (rng.random(size=(patients, WEEK_SIZE, HOUR_PER_DAY)) < density).astype(float),
+        'dispon_m_d_h': (rng.random(size=(doctors, WEEK_SIZE, HOUR_PER_DAY)) < density).astype(float),
+    }
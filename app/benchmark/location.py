@@ -0,0 +1,51 @@
+import argparse
+import json
+import logging
+import time
+
+import pulp
+
+from app.benchmark.instances import random_params
+from app.model.Model import Model
+
+
+def run(params: dict, location: str) -> dict:
+    model = Model(logger=logging.getLogger(), location=location)
+
+    start = time.perf_counter()
+    prob, _ = model.build(params)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prob.solve(pulp.PULP_CBC_CMD(msg=False, warmStart=True))
+    solve_time = time.perf_counter() - start
+
+    return {
+        "location": location,
+        "locals": len(params['locals']),
+        "variables": prob.numVariables(),
+        "constraints": prob.numConstraints(),
+        "nonzeros": sum(len(constraint) for constraint in prob.constraints.values()),
+        "build_time": build_time,
+        "solve_time": solve_time,
+        "status": pulp.LpStatus[prob.status],
+        "objective": pulp.value(prob.objective),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the pairwise and indicator one-location-per-day formulations.")
+    parser.add_argument("--doctors", type=int, default=15)
+    parser.add_argument("--patients", type=int, default=100)
+    parser.add_argument("--locals", type=int, nargs="+", default=[ 2, 3, 4, 6 ])
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    for n_locals in args.locals:
+        params = random_params(doctors=args.doctors, patients=args.patients, locals_=n_locals, seed=args.seed)
+
+        for location in ("pairwise", "indicator"):
+            print(json.dumps(run(params, location)), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import openpyxl
+import pulp
+
+from app.benchmark.workbook import random_workbook
+from app.export import open_session
+from app.loader.Loader import Loader
+from app.model.Model import Model
+from app.model.feasibility import feasible_tuples
+from app.model.matrix import MatrixModel
+from app.model.presolve import presolve
+
+
+def load(file_path: str) -> dict:
+    loader = Loader()
+    loader.file_path = file_path
+
+    return loader.load()
+
+def build(model: Model, params: dict, directory: str) -> dict:
+    # INFO: The work Model.solve_matrix does before calling CBC, on the whole presolved instance.
+    reduced, _, _, _ = presolve(params)
+    tuples = feasible_tuples(reduced)
+
+    model.warm_start(reduced, tuples)
+
+    matrix = MatrixModel(reduced, tuples, location=model.location)
+    matrix.write_mps(os.path.join(directory, "model.mps"))
+
+    return { "variables": matrix.n_columns, "constraints": matrix.n_rows, "nonzeros": matrix.nonzeros }
+
+def solve(model: Model, params: dict) -> dict:
+    solution, status, solver_time = model.optimze(params)
+
+    return { "status": status, "objective": len(solution), "solver_time": solver_time, "solution": solution }
+
+def export(file_path: str, params: dict, solution: np.ndarray):
+    session = open_session(file_path)
+    session.clear_output()
+    session.write_output(params, solution)
+    session.write_errors(list())
+    session.save()
+
+def measure(phase, *args, memory: bool = False) -> tuple[object, dict]:
+    start = time.perf_counter()
+    result = phase(*args)
+    measures = { "time": time.perf_counter() - start }
+
+    # INFO: tracemalloc slows every allocation down, so memory is measured on a second run.
+    if memory:
+        tracemalloc.start()
+        phase(*args)
+        _, measures["peak_memory"] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return result, measures
+
+def run(doctors: int, patients: int, args: argparse.Namespace) -> dict:
+    model_options = { "profile": { "time_limit": args.time_limit, "threads": args.threads }, "workers": 1 }
+
+    record = { "doctors": doctors, "patients": patients, "locals": args.locals, "density": args.density, "seed": args.seed }
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "instance.xlsx")
+
+        start = time.perf_counter()
+        random_workbook(file_path, doctors, patients, args.locals, args.density, tuple(args.age_mix), args.seed)
+        record["generate_time"] = time.perf_counter() - start
+        record["workbook_size"] = os.path.getsize(file_path)
+
+        params, record["load"] = measure(load, file_path, memory=args.memory)
+
+        sizes, record["build"] = measure(build, Model(logging.getLogger(), **model_options), params, directory, memory=args.memory)
+        record["build"].update(sizes)
+
+        result, record["solve"] = measure(solve, Model(logging.getLogger(), **model_options), params, memory=args.memory)
+        solution = result.pop("solution")
+        record["solve"].update(result)
+
+        _, record["export"] = measure(export, file_path, params, solution, memory=args.memory)
+
+    record["total_time"] = sum(record[phase]["time"] for phase in ("load", "build", "solve", "export"))
+
+    return record
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "openpyxl": openpyxl.__version__,
+        "pulp": pulp.__version__,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Time (and optionally memory) of load, build, solve and export over a grid of generated instances.")
+    parser.add_argument("--doctors", type=int, nargs="+", default=[ 10, 30, 100 ])
+    parser.add_argument("--patients", type=int, nargs="+", default=[ 100, 300, 1000 ])
+    parser.add_argument("--locals", type=int, default=4)
+    parser.add_argument("--density", type=float, default=0.4)
+    parser.add_argument("--age-mix", type=float, nargs=3, default=[ 0.2, 0.2, 0.6 ], metavar=("INFANTIL", "ADOLESCENTE", "ADULTO"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-limit", type=float, default=60.0, help="CBC time limit of the solve phase.")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--memory", action="store_true", help="Also measure the peak memory of each phase, running it a second time.")
+    parser.add_argument("--budget", type=float, default=None, help="Skip the bigger instances once one takes longer than this, in seconds.")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file with the environment and one record per instance.")
+
+    args = parser.parse_args()
+
+    # INFO: Smallest instances first, so the budget stops at the first size that hits the wall.
+    grid = sorted(((d, p) for d in args.doctors for p in args.patients), key=lambda size: (size[0] * size[1], size))
+
+    results = { "environment": environment(), "records": list() }
+
+    for doctors, patients in grid:
+        if args.budget is not None and any(r.get("total_time", 0) > args.budget for r in results["records"]):
+            record = { "doctors": doctors, "patients": patients, "skipped": True }
+        else:
+            record = run(doctors, patients, args)
+
+        results["records"].append(record)
+        print(json.dumps(record), flush=True)
+
+        # INFO: Rewritten after every instance, an interrupted run keeps what it measured.
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
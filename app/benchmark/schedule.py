@@ -0,0 +1,149 @@
+import argparse
+import collections
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import openpyxl
+import openpyxl.styles
+
+from app.export.excel import create_schedulling, stream_schedulling
+
+
+# INFO: Cell by cell implementation that ExportSession used before, kept as the reference.
+def legacy_schedulling(sheet, solution, map_local, map_patient, map_professionals):
+    thin = openpyxl.styles.Side(border_style="thin", color="000000")
+
+    per_doctor_schedulle = collections.defaultdict(list)
+
+    for row in solution:
+        per_doctor_schedulle[int(row[0])].append(row)
+
+    base_row, base_column = 2, 2
+
+    for k, apointemnts in per_doctor_schedulle.items():
+        sheet.merge_cells(None, start_row=base_row, end_row=base_row, start_column=base_column, end_column=base_column + 6)
+
+        sheet.cell(row=base_row, column=base_column).alignment = openpyxl.styles.Alignment(horizontal='center')
+
+        for i in range(13):
+            sheet.cell(row=base_row + 1 + (i + 1), column=base_column).value = 8 + i
+
+        for i, day in enumerate([ "seg", "ter", "qua", "qui", "sex", "sab" ]):
+            sheet.cell(row=base_row + 1, column=base_column + i + 1).value = day
+
+        local = 0
+        for m, p, d, h, l in apointemnts:
+            patient_name = map_patient[p]
+            patient_text = f"{patient_name}*" if l == 0 else patient_name
+
+            local = l if l != 0 else local
+
+            sheet.cell(row=base_row + 1 + (h + 1), column=base_column + (d + 1)).value = patient_text
+
+        for r in range(base_row, base_row + 15):
+            for c in range(base_column, base_column + 7):
+                sheet.cell(r, c).border = openpyxl.styles.Border(top=thin, bottom=thin, left=thin, right=thin)
+
+        sheet.cell(row=base_row, column=base_column).value = f"{map_professionals[k]} - {map_local[local]}"
+
+        base_row += 13 + 3
+
+def random_schedule(doctors: int, locals_: int = 4, occupancy: float = 0.6, seed: int = 0):
+    rng = np.random.default_rng(seed)
+
+    rows = list()
+
+    for m in range(doctors):
+        slots = np.flatnonzero(rng.random(6 * 13) < occupancy)
+
+        for slot in slots:
+            rows.append((m, len(rows), slot // 13, slot % 13, rng.integers(0, locals_ + 1)))
+
+    solution = np.array(rows, dtype=np.int64).reshape(-1, 5)
+    # INFO: Appointments of a doctor are not contiguous in a real solution.
+    solution = solution[rng.permutation(len(solution))]
+
+    map_local = { l: f"local_{l}" if l else "Virtual" for l in range(locals_ + 1) }
+    map_patient = { p: f"paciente_{p}" for p in range(len(solution)) }
+    map_professionals = { m: f"profissional_{m}" for m in range(doctors) }
+
+    return solution, map_local, map_patient, map_professionals
+
+def sheet_content(file_path: str) -> tuple:
+    sheet = openpyxl.load_workbook(file_path)["Agendamento"]
+
+    values = { cell.coordinate: cell.value for row in sheet.iter_rows() for cell in row if cell.value is not None }
+    merges = sorted(str(r) for r in sheet.merged_cells.ranges)
+    # INFO: Cells covered by a merge are drawn from the merged range, their own borders do not show.
+    covered = { c for r in sheet.merged_cells.ranges for c in list(r.cells)[1:] }
+
+    bordered = {
+        cell.coordinate for row in sheet.iter_rows() for cell in row
+        if (cell.row, cell.column) not in covered and cell.border.left.style == cell.border.bottom.style == "thin"
+    }
+    centered = { cell.coordinate for row in sheet.iter_rows() for cell in row if cell.alignment.horizontal == "center" }
+
+    return values, merges, bordered, centered
+
+def render(renderer: str, file_path: str, schedule: tuple) -> float:
+    start = time.perf_counter()
+
+    if renderer == "stream":
+        stream_schedulling(file_path, *schedule)
+    else:
+        workbook = openpyxl.Workbook()
+        workbook.active.title = "Agendamento"
+
+        if renderer == "legacy":
+            legacy_schedulling(workbook.active, *schedule)
+        else:
+            create_schedulling(workbook.active, *schedule)
+
+        workbook.save(file_path)
+
+    return time.perf_counter() - start
+
+def compare(doctors: int, seed: int, check: bool) -> dict:
+    schedule = random_schedule(doctors, seed=seed)
+
+    result = { "doctors": doctors, "appointments": len(schedule[0]) }
+    contents = dict()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for renderer in ("legacy", "named", "stream"):
+            file_path = os.path.join(directory, f"{renderer}.xlsx")
+
+            result[f"{renderer}_time"] = render(renderer, file_path, schedule)
+            result[f"{renderer}_bytes"] = os.path.getsize(file_path)
+
+            if check:
+                contents[renderer] = sheet_content(file_path)
+
+    if check:
+        result["identical"] = contents["legacy"] == contents["named"] == contents["stream"]
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Render time and file size of the Agendamento sheet against the number of doctors.")
+    parser.add_argument("--doctors", type=int, nargs="+", default=[ 50, 200, 500, 1000 ])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-check", action="store_true", help="Skip reading the files back to compare the renderers.")
+
+    args = parser.parse_args()
+
+    results = list()
+
+    for doctors in args.doctors:
+        results.append(compare(doctors, args.seed, not args.no_check))
+        print(json.dumps(results[-1]), flush=True)
+
+    return 0 if all(result.get("identical", True) for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import argparse
+import sys
+
+import numpy as np
+
+import openpyxl
+
+from app.loader.Loader import HOUR_PER_DAY, WEEK_SIZE
+
+
+DAYS = [ "seg", "ter", "qua", "qui", "sex", "sab" ]
+HOURS = [ f"hr_{8 + h}" for h in range(HOUR_PER_DAY) ]
+
+# INFO: Ages drawn for each bucket of RegraProfissional (infantil, adolescente, adulto).
+AGE_RANGES = [ (3, 12), (12, 18), (18, 80) ]
+
+
+def marks(available: np.ndarray) -> list:
+    # INFO: The input workbooks mark availability with 1 and leave the other cells empty.
+    return [ 1 if value else None for value in available.tolist() ]
+
+def week_rows(names: list[str], available: np.ndarray) -> list[list]:
+    # DESCRIPTION: One block of WEEK_SIZE rows per name, the name only on the first row of its block.
+    rows = list()
+
+    for name, week in zip(names, available):
+        for d, day in enumerate(DAYS):
+            rows.append([ name if d == 0 else None, day ] + marks(week[d]))
+
+    return rows
+
+def random_workbook(
+        file_path: str,
+        doctors: int = 10,
+        patients: int = 60,
+        locals_: int = 3,
+        density: float = 0.4,
+        age_mix: tuple[float, float, float] = (0.2, 0.2, 0.6),
+        seed: int = 0
+    ):
+    # DESCRIPTION: Writes an input workbook with the six sheets laid out as Loader.load_data reads them.
+    rng = np.random.default_rng(seed)
+
+    doctor_names = [ f"prof_{i}" for i in range(doctors) ]
+    patient_names = [ f"pac_{i}" for i in range(patients) ]
+    local_names = [ "virtual_epsi" ] + [ f"unidade_{i}" for i in range(1, locals_) ]
+
+    buckets = rng.choice(len(AGE_RANGES), size=patients, p=np.asarray(age_mix) / np.sum(age_mix))
+    low, high = np.asarray(AGE_RANGES).T
+    ages = rng.integers(low[buckets], high[buckets])
+
+    sheets = {
+        "IdadePaciente": [
+            [ "paciente", "idade" ],
+            *([ name, int(age) ] for name, age in zip(patient_names, ages)),
+        ],
+        "DisponPaciente": [
+            [ "paciente", "dia_semana" ] + HOURS,
+            *week_rows(patient_names, rng.random(size=(patients, WEEK_SIZE, HOUR_PER_DAY)) < density),
+        ],
+        "LocalPaciente": [
+            [ "paciente", "dia_semana" ] + local_names,
+            *week_rows(patient_names, rng.random(size=(patients, WEEK_SIZE, locals_)) < 0.5),
+        ],
+        "RegraProfissional": [
+            [ "profissional", "tipo", "horas_semana", "infantil", "adolescente", "adulto" ],
+            *(
+                [ name, "psicologia", int(hours) ] + [ int(v) for v in attends ]
+                for name, hours, attends in zip(doctor_names, rng.integers(0, 21, size=doctors), rng.random(size=(doctors, 3)) < 0.6)
+            ),
+        ],
+        "DisponProfissional": [
+            [ "profissional", "dia_semana" ] + HOURS,
+            *week_rows(doctor_names, rng.random(size=(doctors, WEEK_SIZE, HOUR_PER_DAY)) < density),
+        ],
+        "LocalProfissional": [
+            [ "profissional" ] + local_names,
+            *([ name ] + marks(available) for name, available in zip(doctor_names, rng.random(size=(doctors, locals_)) < 0.6)),
+        ],
+    }
+
+    # INFO: Written row by row, so large instances never hold the worksheets in memory.
+    workbook = openpyxl.Workbook(write_only=True)
+
+    for title, rows in sheets.items():
+        sheet = workbook.create_sheet(title)
+
+        for row in rows:
+            sheet.append(row)
+
+    workbook.save(file_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a random input workbook in the layout read by the Loader.")
+    parser.add_argument("file", help="Workbook written.")
+    parser.add_argument("--doctors", type=int, default=10)
+    parser.add_argument("--patients", type=int, default=60)
+    parser.add_argument("--locals", type=int, default=3)
+    parser.add_argument("--density", type=float, default=0.4, help="Share of the available day-hours of doctors and patients.")
+    parser.add_argument("--age-mix", type=float, nargs=3, default=[ 0.2, 0.2, 0.6 ], metavar=("INFANTIL", "ADOLESCENTE", "ADULTO"))
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    random_workbook(args.file, args.doctors, args.patients, args.locals, args.density, tuple(args.age_mix), args.seed)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
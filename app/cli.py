@@ -0,0 +1,307 @@
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import zipfile
+
+from app.loader.Loader import Loader
+from app.loader.cache import InstanceCache
+from app.metrics import Metrics
+from app.model.Model import Model
+from app.model.control import SolveControl, progress_message
+from app.model.profiles import DEFAULT_PROFILE, PROFILES, get_profile
+from app.export import export_formats, open_session
+
+
+def schedule_file(
+        file_path: str,
+        model_options: dict,
+        cache: bool = True,
+        export_options: dict | None = None,
+        incremental: bool = False,
+        weeks: int = 1,
+        window: int = 1,
+        trace_memory: bool = False,
+        control: SolveControl | None = None
+    ) -> dict:
+    logger = logging.getLogger(f"app.cli.{os.path.basename(file_path)}")
+
+    summary = {
+        "file": file_path,
+        "status": None,
+        "objective": None,
+        "bound": None,
+        "gap": None,
+        "timings": dict(),
+        "errors": 0,
+        "error": None,
+        "cancelled": False,
+    }
+
+    # INFO: The control of a batch is shared by its files and closed by schedule.
+    owned = control is None
+    control = SolveControl() if owned else control
+    control.on_progress = lambda progress: logger.info(progress_message(progress))
+
+    # INFO: A batch cancelled before this file started leaves its workbook untouched.
+    if control.cancelled:
+        summary["cancelled"] = True
+        summary["error"] = "Agendamento cancelado antes de começar."
+
+        return summary
+
+    metrics = Metrics(trace_memory=trace_memory)
+
+    # INFO: Ctrl-C stops the solver with the best schedule found so far, which is still exported.
+    handler = None
+
+    if threading.current_thread() is threading.main_thread():
+        handler = signal.signal(signal.SIGINT, lambda *_: control.cancel())
+
+    loader = Loader(logger=logger, cache=InstanceCache() if cache else None, metrics=metrics)
+    loader.file_path = file_path
+
+    output = None
+    changes = None
+
+    try:
+        start = time.perf_counter()
+        data = loader.load()
+        summary["timings"]["load"] = time.perf_counter() - start
+
+        logger.info(f"Carregado: {file_path}")
+
+        start = time.perf_counter()
+        model = Model(logger=logger, metrics=metrics, control=control, **model_options)
+
+        if incremental:
+            solution, status, time_elapsed = model.reoptimize(data, loader.load_solution(data), loader.previous_instance())
+
+            changes = model.changes
+            summary["changes"] = model.stats.get("changes")
+        elif weeks > 1:
+            solution, status, time_elapsed = model.optimze_horizon(data, weeks, window=window)
+
+            summary["weeks"] = model.stats.get("weeks")
+        else:
+            solution, status, time_elapsed = model.optimze(data)
+
+        loader.errors.extend(model.diagnostics)
+
+        summary["presolve"] = model.stats.get("presolve")
+        summary["timings"]["model"] = time.perf_counter() - start
+        summary["timings"]["solver"] = time_elapsed
+
+        summary["status"] = status
+        summary["objective"] = len(solution)
+        summary["bound"] = model.stats.get("bound")
+        summary["gap"] = model.stats.get("gap")
+
+        logger.info(f"Resultado de {file_path}: {status}.")
+
+        if status in ("Optimal", "Feasible"):
+            output = (data, solution)
+    except zipfile.BadZipFile:
+        summary["error"] = "O carregamento falhou, por favor verifique se o arquivo excel está corrompido."
+    except Exception as e:
+        logger.debug("ERROR:", exc_info=True)
+        summary["error"] = f"{type(e).__name__}: {e}"
+
+    # INFO: Results and errors go to the export target in a single load and save.
+    try:
+        start = time.perf_counter()
+
+        with metrics.phase("export"):
+            session = open_session(file_path, logger=logger, **(export_options or dict()))
+            session.clear_output()
+
+            if output is not None:
+                try:
+                    session.write_output(*output)
+
+                    if changes is not None:
+                        session.write_changes(data, changes)
+                except Exception as e:
+                    logger.debug("ERROR:", exc_info=True)
+                    summary["error"] = f"{type(e).__name__}: {e}"
+
+                    session.clear_output()
+
+            session.write_metrics(metrics)
+            session.write_errors(loader.errors)
+            session.save()
+
+        summary["timings"]["export"] = time.perf_counter() - start
+    except zipfile.BadZipFile:
+        summary["error"] = summary["error"] or "O programa falhou ao salvar os errors, por favor verifique se o arquivo excel está corrompido."
+    except Exception as e:
+        logger.debug("ERROR:", exc_info=True)
+        summary["error"] = summary["error"] or f"{type(e).__name__}: {e}"
+
+    summary["errors"] = len(loader.errors)
+    summary["metrics"] = metrics.as_dict()
+    summary["cancelled"] = control.cancelled
+
+    if owned:
+        control.close()
+
+    if handler is not None:
+        signal.signal(signal.SIGINT, handler)
+
+    return summary
+
+def schedule(args: argparse.Namespace) -> int:
+    files = [ os.path.abspath(f) for f in args.files ]
+
+    model_options = {
+        "profile": get_profile(args.profile, time_limit=args.time_limit, gap=args.gap),
+        # INFO: Split the cores among the files solved at the same time, Model splits each file's share among its component workers.
+        "threads": args.threads or max((os.cpu_count() or 1) // args.workers, 1),
+        "workers": args.solver_workers,
+        "backend": args.backend,
+        "builder": args.builder,
+        "aggregate": not args.no_aggregate,
+    }
+
+    export_options = {
+        "export_format": args.export,
+        "stream_schedule": { "auto": None, "inline": False, "stream": True }[args.schedule],
+    }
+
+    failed = 0
+
+    control = SolveControl()
+    futures = dict()
+
+    def cancel(*_):
+        # INFO: The files being solved stop with their best schedules and are saved, the others never start.
+        logging.getLogger(__name__).warning("Cancelando, as melhores soluções encontradas serão salvas e as planilhas restantes ignoradas.")
+
+        control.cancel()
+
+        for future in futures:
+            future.cancel()
+
+    interrupt = signal.signal(signal.SIGINT, cancel)
+
+    # INFO: Each worker runs its own CBC, so the thread budget is per file. Ctrl-C reaches every
+    #       worker, the idle ones ignore it and the busy ones cancel through schedule_file.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN)) as executor:
+        for f in files:
+            future = executor.submit(
+                schedule_file, f, model_options, not args.no_cache, export_options,
+                args.incremental, args.weeks, args.window, args.trace_memory, control
+            )
+            futures[future] = f
+
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                summary = future.result()
+            except concurrent.futures.CancelledError:
+                summary = { "file": futures[future], "status": None, "cancelled": True, "error": "Agendamento cancelado antes de começar." }
+            except Exception as e:
+                summary = { "file": futures[future], "status": None, "error": f"{type(e).__name__}: {e}" }
+
+            if summary["error"] is not None:
+                failed += 1
+
+            print(json.dumps(summary, ensure_ascii=False), flush=True)
+
+    signal.signal(signal.SIGINT, interrupt)
+    control.close()
+
+    return 1 if failed else 0
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Agendador de Pacientes sem interface gráfica.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostra o log de processamento no stderr.")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    schedule_parser = subparsers.add_parser("schedule", help="Agenda uma ou mais planilhas.")
+    schedule_parser.add_argument("files", nargs="+", help="Planilhas .xlsx de entrada, atualizadas no lugar.")
+    schedule_parser.add_argument("-w", "--workers", type=int, default=1, help="Número de planilhas processadas em paralelo.")
+    schedule_parser.add_argument(
+        "-t", "--threads", type=int, default=None,
+        help="Threads do CBC para cada planilha, divididas entre os --solver-workers; por padrão os núcleos divididos entre os workers."
+    )
+    schedule_parser.add_argument(
+        "-p", "--profile", choices=list(PROFILES), default=DEFAULT_PROFILE,
+        help="Perfil do resolvedor (limite de tempo, gap relativo, threads e semente)."
+    )
+    schedule_parser.add_argument("--time-limit", type=float, default=None, help="Limite de tempo do CBC em segundos.")
+    schedule_parser.add_argument("--gap", type=float, default=None, help="Gap relativo aceito pelo CBC.")
+    schedule_parser.add_argument(
+        "--backend", choices=[ "auto", "cbc", "flow" ], default="auto",
+        help="auto usa fluxo máximo quando ele é exato e o CBC nos demais casos."
+    )
+    schedule_parser.add_argument(
+        "--builder", choices=[ "matrix", "pulp" ], default="matrix",
+        help="Construção do modelo: matriz esparsa direta ou objetos do PuLP."
+    )
+    schedule_parser.add_argument(
+        "--no-aggregate", action="store_true",
+        help="Não agrupa pacientes com as mesmas regras, idade, horários e locais em uma única linha do modelo."
+    )
+    schedule_parser.add_argument(
+        "--solver-workers", type=int, default=1,
+        help="Processos usados para resolver os componentes independentes de cada planilha."
+    )
+    schedule_parser.add_argument(
+        "--trace-memory", action="store_true",
+        help="Mede a memória alocada em cada etapa (tracemalloc), o carregamento fica várias vezes mais lento."
+    )
+    schedule_parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Sempre lê as planilhas de entrada, sem reutilizar os dados já carregados."
+    )
+    schedule_parser.add_argument(
+        "--incremental", action="store_true",
+        help="Parte da aba Solução da execução anterior e só reotimiza os profissionais e pacientes alterados desde então."
+    )
+    schedule_parser.add_argument(
+        "--weeks", type=int, default=1,
+        help="Número de semanas agendadas, uma janela por vez, os pacientes não atendidos passam para a semana seguinte."
+    )
+    schedule_parser.add_argument(
+        "--window", type=int, default=1,
+        help="Semanas otimizadas juntas em cada janela do horizonte, só a primeira delas é mantida."
+    )
+    schedule_parser.add_argument(
+        "--export", choices=export_formats(), default="excel",
+        help="Destino dos resultados: as abas da própria planilha (excel) ou arquivos <planilha>_<tabela>.<formato> ao lado dela."
+    )
+    schedule_parser.add_argument(
+        "--schedule", choices=[ "inline", "stream", "auto" ], default="inline",
+        help="Aba Agendamento na própria planilha (inline, padrão) ou em <planilha>_agendamento.xlsx gravada em fluxo (stream), auto grava em fluxo só com mais de 300 profissionais."
+    )
+    schedule_parser.set_defaults(handler=schedule)
+
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    parser = create_parser()
+    args = parser.parse_args(argv)
+
+    if getattr(args, "weeks", 1) < 1 or getattr(args, "window", 1) < 1:
+        parser.error("--weeks e --window devem ser positivos.")
+
+    if getattr(args, "incremental", False) and args.weeks > 1:
+        parser.error("--incremental não pode ser combinado com --weeks.")
+
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='[%(asctime)s][%(levelname)s][%(name)s]: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
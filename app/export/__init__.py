@@ -1,6 +1,24 @@
-from app.export.excel import save_output
+import logging
+
+from app.export.excel import ExportSession, save_output
+from app.export.columnar import ColumnarSession, available_formats
+
+
+def export_formats() -> list[str]:
+    return [ "excel" ] + available_formats()
+
+def open_session(file_path: str, export_format: str = "excel", logger: logging.Logger = logging.getLogger(), stream_schedule: bool | None = False):
+    # INFO: Both sessions take the same calls: clear_output, write_output, write_changes, write_metrics, write_errors and save.
+    if export_format == "excel":
+        return ExportSession(file_path, logger=logger, stream_schedule=stream_schedule)
+
+    return ColumnarSession(file_path, export_format, logger=logger)
 
 
 __all__ = [
+    "ColumnarSession",
+    "ExportSession",
+    "export_formats",
+    "open_session",
     "save_output"
 ]
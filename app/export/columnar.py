@@ -0,0 +1,136 @@
+import datetime
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from app.export.excel import CHANGE_COLUMNS, analysis, changes_table, day_name
+from app.metrics import METRICS_COLUMNS, Metrics
+
+
+SOLUTION_COLUMNS = [ "m", "p", "d", "h", "l", "doctor", "patient", "day", "hour", "local", "created_at" ]
+ANALYSIS_COLUMNS = [ "indicator", "label", "value" ]
+ERROR_COLUMNS = [ "table", "type", "message", "created_at" ]
+
+
+def write_csv(frame: pd.DataFrame, file_path: str):
+    frame.to_csv(file_path, index=False, encoding="utf-8")
+
+def write_jsonl(frame: pd.DataFrame, file_path: str):
+    frame.to_json(file_path, orient="records", lines=True, force_ascii=False)
+
+def write_parquet(frame: pd.DataFrame, file_path: str):
+    # INFO: Parquet columns have a single type, names read as numbers are written as text.
+    names = { column: str for column in frame.columns if frame[column].dtype == object }
+
+    frame.astype(names).to_parquet(file_path, index=False, engine="pyarrow")
+
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "parquet": write_parquet,
+}
+
+def available_formats() -> list[str]:
+    return [ name for name in WRITERS if name != "parquet" or pyarrow is not None ]
+
+def table_path(file_path: str, table: str, export_format: str) -> str:
+    return f"{os.path.splitext(file_path)[0]}_{table}.{export_format}"
+
+def names_of(mapping: dict, indices: np.ndarray) -> np.ndarray:
+    # INFO: One lookup for the whole column instead of one per appointment.
+    return pd.Series(mapping, dtype=object).reindex(indices).to_numpy()
+
+def solution_frame(response: dict, solution: np.ndarray, created_at: str) -> pd.DataFrame:
+    solution = np.asarray(solution, dtype=np.int64).reshape(-1, 5)
+
+    frame = pd.DataFrame(solution, columns=[ "m", "p", "d", "h", "l" ])
+
+    frame["doctor"] = names_of(response["doctor_names"], solution[:, 0])
+    frame["patient"] = names_of(response["patient_names"], solution[:, 1])
+    frame["day"] = np.asarray([ day_name(d) for d in range(solution[:, 2].max(initial=0) + 1) ], dtype=object)[solution[:, 2]]
+    frame["hour"] = np.char.add("hr_", (solution[:, 3] + 8).astype(str)).astype(object)
+    frame["local"] = names_of(response["local_names"], solution[:, 4])
+    frame["created_at"] = created_at
+
+    return frame
+
+def analysis_frame(response: dict, solution: np.ndarray) -> pd.DataFrame:
+    rows = [ (indicator, label, value) for indicator, data in analysis(response, solution).items() for label, value in data ]
+
+    return pd.DataFrame(rows, columns=ANALYSIS_COLUMNS)
+
+def errors_frame(errors: list, created_at: str) -> pd.DataFrame:
+    frame = pd.DataFrame(errors, columns=ERROR_COLUMNS[:-1])
+    frame["created_at"] = created_at
+
+    return frame
+
+class ColumnarSession(object):
+
+    # DESCRIPTION: Same steps as ExportSession, the output tables go to files beside the workbook instead of its sheets.
+    def __init__(self, file_path: str, export_format: str, logger: logging.Logger = logging.getLogger()):
+        if export_format not in available_formats():
+            raise ValueError(f"Formato de exportação indisponível: {export_format}")
+
+        self.file_path = file_path
+        self.export_format = export_format
+        self.logger = logger
+
+        self.tables = dict()
+        self.clear_output()
+
+    def now(self) -> str:
+        return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def clear_output(self):
+        self.tables["solucao"] = pd.DataFrame(columns=SOLUTION_COLUMNS)
+        self.tables["analise"] = pd.DataFrame(columns=ANALYSIS_COLUMNS)
+        self.tables["alteracoes"] = pd.DataFrame(columns=CHANGE_COLUMNS)
+        self.tables["metricas"] = pd.DataFrame(columns=METRICS_COLUMNS)
+
+    def write_errors(self, errors: list):
+        self.logger.debug(f"errors: {errors}")
+
+        self.tables["inconsistencia"] = errors_frame(errors, self.now())
+
+    def write_changes(self, response: dict, changes: np.ndarray):
+        self.tables["alteracoes"] = pd.DataFrame(changes_table(response, changes), columns=CHANGE_COLUMNS)
+
+    def write_metrics(self, metrics: Metrics):
+        # INFO: The model statistics fill the first two columns, as in the Métricas sheet.
+        self.tables["metricas"] = pd.DataFrame(metrics.rows(), columns=METRICS_COLUMNS, dtype=object)
+
+    def write_output(self, response: dict, solution: np.ndarray):
+        self.tables["solucao"] = solution_frame(response, solution, self.now())
+        self.tables["analise"] = analysis_frame(response, solution)
+
+    def save(self):
+        # INFO: Every table is written aside first and only then renamed, as ExportSession.save does.
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        written = list()
+
+        try:
+            for table, frame in self.tables.items():
+                descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=".~", suffix=f".{self.export_format}")
+                os.close(descriptor)
+
+                written.append((temporary_path, table_path(self.file_path, table, self.export_format)))
+
+                WRITERS[self.export_format](frame, temporary_path)
+        except BaseException:
+            for temporary_path, _ in written:
+                os.remove(temporary_path)
+            raise
+
+        for temporary_path, target in written:
+            os.replace(temporary_path, target)
+
+        self.logger.info(f"Resultados salvos em {table_path(self.file_path, '*', self.export_format)}.")
@@ -2,6 +2,9 @@ import collections
 import datetime
 import json
 import logging
+import os
+import shutil
+import tempfile
 
 import numpy as np
 
@@ -11,6 +14,10 @@ import openpyxl.chart
 import openpyxl.chart.label
 import openpyxl.chart.legend
 import openpyxl.chart.text
+import openpyxl.cell
+import openpyxl.worksheet.cell_range
+
+from app.metrics import METRICS_COLUMNS, Metrics
 
 class NumpyEncoder(json.JSONEncoder):
     def default(self, o):
@@ -19,202 +26,416 @@ class NumpyEncoder(json.JSONEncoder):
             return str(o.tolist())
         return super().default(o)
 
-def clear_past_output(file_path: str):
-    workbook = openpyxl.load_workbook(file_path)
+def has_past_output(file_path: str) -> bool:
+    if os.path.exists(schedule_path(file_path)):
+        return True
 
-    if "Inconsistência" in workbook.sheetnames:
-        sheet = workbook["Inconsistência"]
-        sheet.delete_rows(idx=2, amount=sheet.max_row - 1)
+    # INFO: Read-only, the sheet dimensions are enough to know if there is anything to clear.
+    workbook = openpyxl.load_workbook(file_path, read_only=True)
 
-    if "Agendamento" in workbook.sheetnames:
-        sheet = workbook["Agendamento"]
-        sheet.delete_rows(idx=2, amount=sheet.max_row - 1)
+    try:
+        for name in ("Inconsistência", "Agendamento", "Análise", "Solução", "Alterações"):
+            if name not in workbook.sheetnames:
+                continue
 
-    if "Análise" in workbook.sheetnames:
-        sheet = workbook["Análise"]
-        sheet.delete_rows(idx=2, amount=sheet.max_row - 1)
+            max_row = workbook[name].max_row
 
-    if "Solução" in workbook.sheetnames:
-        sheet = workbook["Solução"]
-        sheet.delete_rows(idx=2, amount=sheet.max_row - 1)
+            if max_row is None or max_row > 1:
+                return True
 
-    workbook.save(file_path)
+        return False
+    finally:
+        workbook.close()
+
+def clear_past_output(file_path: str):
+    # INFO: Loading and saving the whole workbook is slow, skip it when the output sheets are empty.
+    if not has_past_output(file_path):
+        return
+
+    session = ExportSession(file_path)
+    session.clear_output()
+    session.save()
 
 def save_errors(file_path: str, errors: list, logger: logging.Logger = logging.getLogger()):
-    logger.debug(f"errors: {errors}")
+    session = ExportSession(file_path, logger=logger)
+    session.write_errors(errors)
+    session.save()
 
-    workbook = openpyxl.load_workbook(file_path)
+def save_output(file_path: str, response: dict, solution: np.ndarray, logger: logging.Logger = logging.getLogger()):
+    session = ExportSession(file_path, logger=logger)
+    session.write_output(response, solution)
+    session.save()
 
-    if "Inconsistência" not in workbook.sheetnames:
-        workbook.create_sheet("Inconsistência")
+OUTPUT_HEADERS = {
+    "Solução": [ "paciente", "profissional", "dia", "horario", "local", "data" ],
+    "Inconsistência": [ "tabela", "tipo", "mensagem", "data" ],
+}
 
-    sheet = workbook['Inconsistência']
+class ExportSession(object):
 
-    max_row = sheet.max_row
+    # DESCRIPTION: Opens the workbook once, rewrites the output sheets in memory and saves once.
+    def __init__(self, file_path: str, logger: logging.Logger = logging.getLogger(), stream_schedule: bool | None = False):
+        self.file_path = file_path
+        self.logger = logger
+        self.workbook = openpyxl.load_workbook(file_path)
 
-    for row in range(max_row, 1, -1):
-        sheet.delete_rows(row)
+        # INFO: True writes the schedule to its own streamed workbook, None only when it has more than STREAM_SCHEDULE_DOCTORS doctors.
+        self.stream_schedule = stream_schedule
+        self.streamed_schedule = None
+        self.schedule_replaced = False
 
-    for error in errors:
-        sheet.append(( error["table"], error["type"], error["message"], datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") ))
+    def clear_rows(self, title: str):
+        # INFO: Keeps the header, everything below it goes in a single call.
+        if title not in self.workbook.sheetnames:
+            # INFO: A sheet created here gets a header too, otherwise its first row would be kept as one.
+            self.workbook.create_sheet(title).append(OUTPUT_HEADERS[title])
 
-    workbook.save(file_path)
+        sheet = self.workbook[title]
 
-def save_output(file_path: str, response: dict, solution: np.ndarray, logger: logging.Logger = logging.getLogger()):
-    solve_columns = list()
+        if sheet.max_row > 1:
+            sheet.delete_rows(idx=2, amount=sheet.max_row - 1)
+
+        return sheet
+
+    def replace_sheet(self, title: str):
+        # INFO: A fresh sheet in the same position, dropping old cells, merges and charts at once.
+        if title not in self.workbook.sheetnames:
+            return self.workbook.create_sheet(title=title)
+
+        index = self.workbook.sheetnames.index(title)
+        self.workbook.remove(self.workbook[title])
+
+        return self.workbook.create_sheet(title=title, index=index)
+
+    def clear_output(self):
+        for title in ("Inconsistência", "Solução"):
+            if title in self.workbook.sheetnames:
+                self.clear_rows(title)
+
+        for title in ("Agendamento", "Análise", "Alterações", "Métricas"):
+            if title in self.workbook.sheetnames:
+                self.replace_sheet(title)
+
+        self.discard_streamed_schedule()
+        self.schedule_replaced = True
+
+    def discard_streamed_schedule(self):
+        if self.streamed_schedule is not None:
+            os.remove(self.streamed_schedule)
+            self.streamed_schedule = None
+
+    def write_errors(self, errors: list):
+        self.logger.debug(f"errors: {errors}")
+
+        sheet = self.clear_rows("Inconsistência")
+
+        for error in errors:
+            sheet.append(( error["table"], error["type"], error["message"], datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") ))
+
+    def write_changes(self, response: dict, changes: np.ndarray):
+        # INFO: Only written by the incremental mode, so the sheet and its header are created here.
+        sheet = self.replace_sheet("Alterações")
+
+        sheet.append(CHANGE_COLUMNS)
+
+        for row in changes_table(response, changes):
+            sheet.append(row)
+
+    def write_metrics(self, metrics: Metrics):
+        # INFO: Written before save, so the export itself is only in the log and in the CLI result.
+        sheet = self.replace_sheet("Métricas")
+
+        sheet.append(METRICS_COLUMNS)
+
+        for row in metrics.rows():
+            sheet.append(row)
+
+    def write_output(self, response: dict, solution: np.ndarray):
+        solve_columns = list()
+
+        hour_map = { i: hour for i, hour in enumerate([ "hr_" + str(x + 8) for x in range(13) ]) }
+
+        self.logger.debug(json.dumps(response, indent=2, ensure_ascii=False, skipkeys=True, cls=NumpyEncoder))
+
+        for row in solution:
+            new_row = list()
+
+            # ===================================================
+            new_row.append(response['patient_names'][row[1]])
+            new_row.append(response['doctor_names'][row[0]])
+            # ===================================================
+            new_row.append(day_name(row[2]))
+            new_row.append(hour_map[row[3]])
+            new_row.append(response["local_names"][row[4]])
+            new_row.append(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+            solve_columns.append(new_row)
+
+        self.logger.debug(solve_columns)
+
+        sheet = self.clear_rows("Solução")
+
+        for solve in solve_columns:
+            sheet.append(solve)
+
+        map_local = response["local_names"]
+        map_professionals = response["doctor_names"]
+        map_patient = response['patient_names']
+
+        schedule_sheet = self.replace_sheet("Agendamento")
+
+        stream = self.stream_schedule
+        if stream is None:
+            stream = len(np.unique(solution[:, 0])) > STREAM_SCHEDULE_DOCTORS
+
+        if stream:
+            # INFO: Written now beside the workbook and moved in place by save, together with it.
+            self.discard_streamed_schedule()
+            self.streamed_schedule = self.temporary_path()
+
+            try:
+                stream_schedulling(self.streamed_schedule, solution, map_local, map_patient, map_professionals)
+            except BaseException:
+                self.discard_streamed_schedule()
+                raise
 
-    days_map = { i: day for i, day in enumerate([ "seg", "ter", "qua", "qui", "sex", "sab" ]) }
-    hour_map = { i: hour for i, hour in enumerate([ "hr_" + str(x + 8) for x in range(13) ]) }
+            schedule_sheet.append([ "Agenda completa em:", os.path.basename(schedule_path(self.file_path)) ])
 
-    logger.debug(json.dumps(response, indent=2, ensure_ascii=False, skipkeys=True, cls=NumpyEncoder))
+            self.logger.info(f"Agenda salva separadamente em {schedule_path(self.file_path)}.")
+        else:
+            create_schedulling(schedule_sheet, solution, map_local, map_patient, map_professionals)
+            self.schedule_replaced = True
 
-    for row in solution:
-        new_row = list()
+        kpi_sheet = self.replace_sheet("Análise")
 
-        # ===================================================
-        new_row.append(response['patient_names'][row[1]])
-        new_row.append(response['doctor_names'][row[0]])
-        # ===================================================
-        new_row.append(days_map[row[2]])
-        new_row.append(hour_map[row[3]])
-        new_row.append(response["local_names"][row[4]])
-        new_row.append(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        kpis = analysis(response, solution)
 
-        solve_columns.append(new_row)
+        professionals_per_location = kpis["Profissionais por Localidade"]
+        appointments_per_location = kpis["Agendamentos por Localidade"]
+        appointments_per_day = kpis["Agendamentos por Dia da Semana"]
+        appointments_per_professional = kpis["Agendamentos por Profissional"]
 
-    logger.debug(solve_columns)
+        base_row = 2
 
-    workbook = openpyxl.load_workbook(file_path)
+        plot(kpi_sheet, "F5",
+             professionals_per_location, base_row=base_row,
+             title="Profissionais por Localidade",
+             x_axis_title="Local",
+             y_axis_title="# Profissionais")
 
-    if "Solução" not in workbook.sheetnames:
-        workbook.create_sheet("Solução")
+        base_row = base_row + len(professionals_per_location) + 1
 
-    sheet = workbook['Solução']
+        plot(kpi_sheet, "F20",
+             appointments_per_location, base_row=base_row,
+             title="Agendamentos por Localidade",
+             x_axis_title="Local",
+             y_axis_title="# Agendamentos")
 
-    max_row = sheet.max_row
+        base_row = base_row + len(appointments_per_location) + 1
 
-    for row in range(max_row, 1, -1):
-        sheet.delete_rows(row)
+        plot(kpi_sheet, "O5",
+             appointments_per_day,
+             base_row=base_row,
+             title="Agendamentos por Dia da Semana",
+             x_axis_title="Dia da Semana",
+             y_axis_title="# Agendamentos")
 
-    for solve in solve_columns:
-        sheet.append(solve)
+        base_row = base_row + len(appointments_per_day) + 1
 
+        plot(kpi_sheet, "O20",
+             appointments_per_professional,
+             base_row=base_row,
+             title="Agendamentos por Profissional",
+             x_axis_title="Profisionnal",
+             y_axis_title="# Agendamentos")
+
+    def temporary_path(self) -> str:
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=".~", suffix=".xlsx")
+        os.close(descriptor)
+
+        return temporary_path
+
+    def save(self):
+        # INFO: Saved beside the original and renamed over it, a failure never leaves a half-written file.
+        temporary_path = self.temporary_path()
+
+        try:
+            self.workbook.save(temporary_path)
+            shutil.copymode(self.file_path, temporary_path)
+            os.replace(temporary_path, self.file_path)
+        except BaseException:
+            os.remove(temporary_path)
+            self.discard_streamed_schedule()
+            raise
+
+        # INFO: A schedule written inside the workbook makes the one from an older run stale.
+        if self.streamed_schedule is not None:
+            shutil.copymode(self.file_path, self.streamed_schedule)
+            os.replace(self.streamed_schedule, schedule_path(self.file_path))
+            self.streamed_schedule = None
+        elif self.schedule_replaced and os.path.exists(schedule_path(self.file_path)):
+            os.remove(schedule_path(self.file_path))
+
+def analysis(response: dict, solution: np.ndarray) -> dict[str, list[tuple[str, int]]]:
+    # DESCRIPTION: Indicators of the Análise sheet, as (label, value) pairs by chart title.
     map_local = response["local_names"]
     map_professionals = response["doctor_names"]
-    map_patient = response['patient_names']
-    map_day = [ "seg", "ter", "qua", "qui", "sex", "sab" ]
+    map_day = { d: day_name(d) for d in np.unique(solution[:, 2]).tolist() }
 
-    create_schedulling(workbook, solution, map_local, map_patient, map_professionals)
+    def counts(column: int, names) -> list[tuple[str, int]]:
+        return [
+            (str(names[row[0]]), int(row[1]))
+            for row in np.column_stack(np.unique(solution[:, column], return_counts=True))
+        ]
 
-    if "Análise" in workbook.sheetnames:
-        workbook.remove(workbook["Análise"])
+    return {
+        "Profissionais por Localidade": [ (str(map_local[i]), int(v)) for i, v in enumerate(response["local_m_l"].sum(axis=0)) ],
+        "Agendamentos por Localidade": counts(4, map_local),
+        "Agendamentos por Dia da Semana": counts(2, map_day),
+        "Agendamentos por Profissional": counts(0, map_professionals),
+    }
 
-    kpi_sheet = workbook.create_sheet(title="Análise")
+CHANGE_COLUMNS = [
+    "paciente", "situacao",
+    "profissional_anterior", "dia_anterior", "horario_anterior", "local_anterior",
+    "profissional", "dia", "horario", "local"
+]
 
-    professionals_per_location = [ (str(map_local[i]), int(v)) for i, v in enumerate(response["local_m_l"].sum(axis=0)) ]
+def changes_table(response: dict, changes: np.ndarray) -> list[list]:
+    # DESCRIPTION: Rows of CHANGE_COLUMNS from the output of app.model.incremental.solution_changes.
+    def appointment(m: int, d: int, h: int, l: int) -> list:
+        if m < 0:
+            return [ None ] * 4
 
-    appointments_per_location = [
-        (str(map_local[row[0]]), int(row[1]))
-        for row in np.column_stack(np.unique(solution[:, 4], return_counts=True))
-    ]
+        return [ response["doctor_names"][m], day_name(d), f"hr_{h + 8}", response["local_names"][l] ]
 
-    appointments_per_day = [
-        (str(map_day[row[0]]), int(row[1]))
-        for row in np.column_stack(np.unique(solution[:, 2], return_counts=True))
-    ]
+    rows = list()
 
-    appointments_per_professional = [
-        (str(map_professionals[row[0]]), int(row[1]))
-        for row in np.column_stack(np.unique(solution[:, 0], return_counts=True))
-    ]
+    for p, m0, d0, h0, l0, m1, d1, h1, l1 in np.asarray(changes, dtype=np.int64).reshape(-1, 9).tolist():
+        situation = "nova" if m0 < 0 else "cancelada" if m1 < 0 else "remarcada"
 
-    base_row = 2
+        rows.append([ response["patient_names"][p], situation ] + appointment(m0, d0, h0, l0) + appointment(m1, d1, h1, l1))
 
-    plot(kpi_sheet, "F5",
-         professionals_per_location, base_row=base_row,
-         title="Profissionais por Localidade",
-         x_axis_title="Local",
-         y_axis_title="# Profissionais")
+    return rows
 
-    base_row = base_row + len(professionals_per_location) + 1
+# INFO: Above this many doctors the "auto" mode sends the schedule to its own streamed workbook.
+STREAM_SCHEDULE_DOCTORS = 300
 
-    plot(kpi_sheet, "F20",
-         appointments_per_location, base_row=base_row,
-         title="Agendamentos por Localidade",
-         x_axis_title="Local",
-         y_axis_title="# Agendamentos")
+SCHEDULE_DAYS = [ "seg", "ter", "qua", "qui", "sex", "sab" ]
 
-    base_row = base_row + len(appointments_per_location) + 1
+def day_name(d: int) -> str:
+    # INFO: Days after the first week of a multi-week horizon carry the week, "seg_2" is the monday of the second one.
+    week, day = divmod(int(d), len(SCHEDULE_DAYS))
 
-    plot(kpi_sheet, "O5",
-         appointments_per_day,
-         base_row=base_row,
-         title="Agendamentos por Dia da Semana",
-         x_axis_title="Dia da Semana",
-         y_axis_title="# Agendamentos")
+    return SCHEDULE_DAYS[day] if week == 0 else f"{SCHEDULE_DAYS[day]}_{week + 1}"
 
-    base_row = base_row + len(appointments_per_day) + 1
+def schedule_path(file_path: str) -> str:
+    root, extension = os.path.splitext(file_path)
 
-    plot(kpi_sheet, "O20",
-         appointments_per_professional,
-         base_row=base_row,
-         title="Agendamentos por Profissional",
-         x_axis_title="Profisionnal",
-         y_axis_title="# Agendamentos")
+    return f"{root}_agendamento{extension or '.xlsx'}"
 
-    workbook.save(file_path)
+def schedule_styles(workbook) -> dict[str, str]:
+    # DESCRIPTION: Named styles shared by every schedule cell, registered once per workbook.
+    thin = openpyxl.styles.Side(border_style="thin", color="000000")
+    border = openpyxl.styles.Border(top=thin, bottom=thin, left=thin, right=thin)
 
-def create_schedulling(
-        workbook: openpyxl.Workbook,
+    styles = {
+        "cell": openpyxl.styles.NamedStyle(name="Agenda", border=border),
+        "title": openpyxl.styles.NamedStyle(name="Agenda Título", border=border, alignment=openpyxl.styles.Alignment(horizontal="center")),
+    }
+
+    for style in styles.values():
+        if style.name not in workbook.named_styles:
+            workbook.add_named_style(style)
+
+    return { key: style.name for key, style in styles.items() }
+
+def schedule_blocks(
         solution: np.ndarray,
         map_local: dict[int, str],
         map_patient: dict[int, str],
         map_professionals: dict[int, str]
     ):
-    if "Agendamento" in workbook.sheetnames:
-        workbook.remove(workbook["Agendamento"])
+    # DESCRIPTION: One (title, 13x6 grid of patients) block per doctor and week, in the order they appear in the solution.
+    per_doctor_schedulle = collections.defaultdict(list)
 
-    sheet = workbook.create_sheet(title="Agendamento")
+    for row in solution.tolist():
+        per_doctor_schedulle[(row[0], row[2] // len(SCHEDULE_DAYS))].append(row)
 
-    thin = openpyxl.styles.Side(border_style="thin", color="000000")
+    multi_week = any(week > 0 for _, week in per_doctor_schedulle)
 
-    per_doctor_schedulle = collections.defaultdict(list)
+    for (k, week), apointemnts in per_doctor_schedulle.items():
+        grid = [ [ None ] * len(SCHEDULE_DAYS) for _ in range(13) ]
+
+        local = 0
+        for m, p, d, h, l in apointemnts:
+            patient_name = map_patient[p]
+            grid[h][d % len(SCHEDULE_DAYS)] = f"{patient_name}*" if l == 0 else patient_name
 
-    for row in solution:
-        per_doctor_schedulle[int(row[0])].append(row)
+            local = l if l != 0 else local
 
-    base_row, base_column = 2, 2
+        title = f"{map_professionals[k]} - {map_local[local]}"
+
+        yield (f"{title} - semana {week + 1}" if multi_week else title), grid
+
+def create_schedulling(
+        sheet,
+        solution: np.ndarray,
+        map_local: dict[int, str],
+        map_patient: dict[int, str],
+        map_professionals: dict[int, str]
+    ):
+    # INFO: Rows are appended whole with shared named styles, works for write-only sheets too.
+    styles = schedule_styles(sheet.parent)
 
-    for k, apointemnts in per_doctor_schedulle.items():
-        # INFO: Title cells.
-        sheet.merge_cells(None, start_row=base_row, end_row=base_row, start_column=base_column, end_column=base_column + 6)
+    def row(values: list, style: str) -> list:
+        cells = [ None ]
 
-        sheet.cell(row=base_row, column=base_column).alignment = openpyxl.styles.Alignment(horizontal='center')
+        for value in values:
+            cell = openpyxl.cell.WriteOnlyCell(sheet, value=value)
+            cell.style = style
+            cells.append(cell)
 
-        # INFO: Time of the day.
-        for i in range(13):
-            sheet.cell(row=base_row + 1 + (i + 1), column=base_column).value = 8 + i
+        return cells
 
-        for i, day in enumerate([ "seg", "ter", "qua", "qui", "sex", "sab" ]):
-            sheet.cell(row=base_row + 1, column=base_column + i + 1).value = day
+    base_row, base_column = 2, 2
 
-        local = 0
-        for m, p, d, h, l in apointemnts:
-            patient_name = map_patient[p]
-            patient_text = f"{patient_name}*" if l == 0 else patient_name
+    sheet.append([])
 
-            local = l if l != 0 else local
+    for title, grid in schedule_blocks(solution, map_local, map_patient, map_professionals):
+        if base_row > 2:
+            sheet.append([])
 
-            sheet.cell(row=base_row + 1 + (h + 1), column=base_column + (d + 1)).value = patient_text
+        sheet.append(row([ title ] + [ None ] * len(SCHEDULE_DAYS), styles["title"]))
+        sheet.append(row([ None ] + SCHEDULE_DAYS, styles["cell"]))
 
-        for r in range(base_row, base_row + 15):
-            for c in range(base_column, base_column + 7):
-                sheet.cell(r, c).border = openpyxl.styles.Border(top=thin, bottom=thin, left=thin, right=thin)
+        # INFO: Time of the day in the first column.
+        for i, patients in enumerate(grid):
+            sheet.append(row([ 8 + i ] + patients, styles["cell"]))
 
-        sheet.cell(row=base_row, column=base_column).value = f"{map_professionals[k]} - {map_local[local]}"
+        # INFO: Title cells, the cells under the merge already carry the borders so it is only registered.
+        sheet.merged_cells.add(openpyxl.worksheet.cell_range.CellRange(
+            min_row=base_row, max_row=base_row, min_col=base_column, max_col=base_column + 6
+        ))
 
         base_row += 13 + 3
 
+def stream_schedulling(
+        file_path: str,
+        solution: np.ndarray,
+        map_local: dict[int, str],
+        map_patient: dict[int, str],
+        map_professionals: dict[int, str]
+    ):
+    # DESCRIPTION: Same layout as create_schedulling, written row by row to disk instead of held in memory.
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Agendamento")
+
+    create_schedulling(sheet, solution, map_local, map_patient, map_professionals)
+
+    workbook.save(file_path)
+
 def plot(sheet, cell: str, data: list[tuple[str, int]], base_row: int, title: str, x_axis_title: str, y_axis_title: str):
     sheet.append([ "", "" ])
 
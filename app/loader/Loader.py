@@ -5,20 +5,126 @@ from collections import defaultdict
 
 import logging
 
+from app.loader.cache import InstanceCache
+from app.metrics import Metrics
+from app.loader.ingest import read_rows, read_sheets
 
 WEEK_SIZE = 6
 HOUR_PER_DAY = 13
 
+INPUT_SHEETS = [
+    'IdadePaciente',
+    'DisponPaciente',
+    'LocalPaciente',
+    'RegraProfissional',
+    'DisponProfissional',
+    'LocalProfissional'
+]
+
 class Loader(object):
 
-    def __init__(self, logger: logging.Logger = logging.getLogger(__module__)):
+    def __init__(self, logger: logging.Logger = logging.getLogger(__module__), cache: InstanceCache | None = None, metrics: Metrics | None = None):
         self.logger = logger
         self.file_path = str()
         self.errors = list()
+        # INFO: When set, parsed instances are reused while the input sheets do not change.
+        self.cache = cache
+        # INFO: Cache key of the instance read from the same workbook by the previous load.
+        self.previous_key = None
+        # INFO: Time and memory of every load, see app.metrics.
+        self.metrics = metrics if metrics is not None else Metrics()
 
     def load(self):
+        with self.metrics.phase("load"):
+            return self.load_instance()
+
+    def load_instance(self):
         self.errors.clear()
 
+        key = None
+        self.previous_key = None
+
+        if self.cache is not None:
+            try:
+                key = self.cache.key(self.file_path, INPUT_SHEETS)
+            except KeyError:
+                # INFO: Not laid out as a regular xlsx, parse it without caching.
+                key = None
+
+        if key is not None:
+            self.previous_key = self.cache.last(self.file_path)
+            self.cache.remember(self.file_path, key)
+
+        if key is not None and (cached := self.cache.get(key)) is not None:
+            response, errors = cached
+
+            self.errors.extend(errors)
+            self.logger.info("Planilhas de entrada sem alterações, usando os dados já carregados.")
+
+            return response
+
+        response = self.parse()
+
+        if key is not None:
+            self.cache.put(key, response, self.errors)
+
+        return response
+
+    def previous_instance(self) -> dict | None:
+        # DESCRIPTION: Instance of the previous load of this workbook, while it is still cached.
+        if self.cache is None or self.previous_key is None:
+            return None
+
+        cached = self.cache.get(self.previous_key)
+
+        return cached[0] if cached is not None else None
+
+    def load_solution(self, response: dict) -> np.ndarray:
+        # DESCRIPTION: Appointments of the Solução sheet, as [m, p, d, h, l] rows of the given instance.
+        sheet = read_rows(self.file_path, "Solução")
+
+        if not sheet:
+            return np.zeros(shape=(0, 5), dtype=np.int64)
+
+        sheet = pd.DataFrame.from_records(sheet).reindex(columns=range(5))
+
+        def index_of(names: dict) -> dict:
+            index = dict()
+
+            for i, name in names.items():
+                index.setdefault(name, i)
+
+            return index
+
+        days = { day: d for d, day in enumerate([ "seg", "ter", "qua", "qui", "sex", "sab" ]) }
+        hours = { f"hr_{h + 8}": h for h in range(HOUR_PER_DAY) }
+
+        # INFO: Same column order written by the export, the header and unknown names become NaN.
+        columns = [
+            sheet[1].map(index_of(response['doctor_names'])),
+            sheet[0].map(index_of(response['patient_names'])),
+            sheet[2].map(days),
+            sheet[3].map(hours),
+            sheet[4].map(index_of(response['local_names'])),
+        ]
+
+        solution = pd.concat(columns, axis=1)
+        known = solution.notna().all(axis=1)
+
+        # INFO: Days after the first week of a multi-week horizon are not part of the weekly instance.
+        later_weeks = sheet[2].astype(str).str.fullmatch(r"(seg|ter|qua|qui|sex|sab)_\d+")
+
+        if later_weeks.any():
+            self.logger.info(f"{later_weeks.sum()} consultas de semanas seguintes da solução anterior foram ignoradas.")
+
+        ignored = (solution[2].notna() & solution[3].notna() & ~known).sum()
+
+        if ignored:
+            self.logger.info(f"{ignored} consultas da solução anterior não correspondem mais à planilha e foram ignoradas.")
+
+        return solution[known].to_numpy(dtype=np.int64)
+
+    def parse(self):
         data = self.load_data()
 
         response = dict()
@@ -46,18 +152,12 @@ class Loader(object):
         return response
 
     def load_data(self) -> dict:
-        default_sheets = [
-            'IdadePaciente',
-            'DisponPaciente',
-            'LocalPaciente',
-            'RegraProfissional',
-            'DisponProfissional',
-            'LocalProfissional'
-        ]
+        default_sheets = INPUT_SHEETS
 
-        loaded_sheet = pd.ExcelFile(self.file_path)
+        # INFO: A single read-only pass over the workbook, only the input sheets are parsed.
+        data = read_sheets(self.file_path, default_sheets)
 
-        has_all_sheets = all(e in loaded_sheet.sheet_names for e in default_sheets)
+        has_all_sheets = all(e in data for e in default_sheets)
 
         if not has_all_sheets:
             raise Exception("Improper file")
@@ -65,65 +165,48 @@ class Loader(object):
         # TODO: Check for errors in tables.
 
         data = {
-            sheet_name: pd.read_excel(self.file_path, sheet_name=sheet_name).fillna(0) for sheet_name in default_sheets
+            sheet_name: data[sheet_name].fillna(0) for sheet_name in default_sheets
         }
 
         for sheet_name, sheet_data in data.items():
             column_name = 'paciente' if 'Paciente' in sheet_name else 'profissional'
-            data[sheet_name] = self.before_verify_duplicate(sheet_data, column_name)
-            data[sheet_name] = self.verify_duplicate(data[sheet_name], sheet_name, column_name)
-            data[sheet_name] = self.after_verify_duplicate(sheet_data, column_name)
 
-        return data
+            if column_name not in sheet_data.columns:
+                continue
 
+            names = self.before_verify_duplicate(sheet_data, column_name)
+            self.verify_duplicate(names, sheet_name, column_name)
+            data[sheet_name] = self.after_verify_duplicate(sheet_data, names, column_name)
 
-    def before_verify_duplicate(self, data: pd.DataFrame, column_name: str):
+        return data
 
-        current_name = None
-        idx = 0
-        new_column = []
-        for _, row in data.iterrows():
-            if row[column_name] != 0:
-                current_name = row[column_name]
-                idx = 0
-                new_column.append(current_name)
-            else:
-                new_column.append(current_name + "#" + str(idx))
-                idx += 1
 
-        data[column_name] = new_column
+    def before_verify_duplicate(self, data: pd.DataFrame, column_name: str) -> pd.Series:
+        names = data[column_name].astype(object)
 
-        return data
+        named = (names != 0).to_numpy()
+        rows = np.arange(len(names))
 
-    def verify_duplicate(self, data: pd.DataFrame, sheet_name: str, column_name: str):
+        # INFO: Blank rows take the name above them plus a counter: "Ana", "Ana#0", "Ana#1", ...
+        last_named = np.maximum.accumulate(np.where(named, rows, -1))
+        counter = pd.Series(rows - last_named - 1, index=names.index).astype(str)
 
-        if column_name not in data.columns:
-            return data
+        previous = names.where(named).ffill().fillna("").astype(str)
 
-        duplicated = data[column_name][data[column_name].duplicated(keep=False)]
+        return names.where(named, previous + "#" + counter)
 
-        data = data.drop_duplicates(subset=column_name, keep="first")
+    def verify_duplicate(self, names: pd.Series, sheet_name: str, column_name: str):
+        duplicated = names[names.duplicated(keep=False)]
+        duplicated = duplicated[~duplicated.astype(str).str.contains("#", regex=False)]
 
         for name in duplicated.unique():
-            if "#" in name:
-                continue
             self.warning_message(
                 sheet_name,
                 f"{column_name.capitalize()} {name} duplicado na tabela. Considerado apenas o primeiro."
             )
 
-        return data
-
-    def after_verify_duplicate(self, data: pd.DataFrame, column_name: str):
-
-        new_column = []
-        for _, row in data.iterrows():
-            if "#" in row[column_name]:
-                new_column.append(0)
-            else:
-                new_column.append(row[column_name])
-
-        data[column_name] = new_column
+    def after_verify_duplicate(self, data: pd.DataFrame, names: pd.Series, column_name: str) -> pd.DataFrame:
+        data[column_name] = names.where(~names.astype(str).str.contains("#", regex=False), 0)
 
         return data
 
@@ -180,32 +263,35 @@ class Loader(object):
             self.missing_column("IdadePaciente", "idade")
 
         patient_index = np.arange(patient_values.shape[0])
-        patient_map = dict()
+        patient_map = dict(enumerate(patient_values[:, 0].tolist()))
         competence_m_p = np.zeros(shape=(professional_values.shape[0], patient_values.shape[0]))
 
-        for pa, patient_row in enumerate(patient_values):
-            patient_map[pa] = patient_row[0]
-            patient_age = patient_row[1]
+        ages = patient_values[:, 1]
 
-            if not patient_row[0]:
+        no_name = ~patient_values[:, 0].astype(bool)
+        no_age = ~np.fromiter((isinstance(age, (int, float)) for age in ages), dtype=bool, count=len(ages))
+
+        for pa in np.flatnonzero(no_name | no_age).tolist():
+            if no_name[pa]:
                 self.error_missing_value(
                     "IdadePaciente",
                     f"Paciente sem nome cadastratado."
                 )
 
-            if not isinstance(patient_age, (int, float)):
+            if no_age[pa]:
                 self.error_missing_value(
                     "IdadePaciente",
-                    f"Paciente {patient_row[0]} sem idade cadastratada."
+                    f"Paciente {patient_map[pa]} sem idade cadastratada."
                 )
 
-            for pr, professional_row in enumerate(professional_values):
+        if professional_values.shape[0] and patient_values.shape[0]:
+            ages = np.trunc(ages.astype(float))
 
-                if ((int(patient_age) < 12) and (professional_row[3] != 0)) or \
-                    ((12 <= int(patient_age) < 18) and (professional_row[4] != 0)) or \
-                    ((18 <= int(patient_age)) and (professional_row[5] != 0)):
+            # INFO: One-hot age buckets (infantil, adolescente, adulto) of each patient.
+            age_bucket_p = np.stack((ages < 12, (12 <= ages) & (ages < 18), 18 <= ages), axis=1)
+            attends_m = professional_values[:, 3:6] != 0
 
-                    competence_m_p[pr][pa] = 1
+            competence_m_p = (attends_m.astype(float) @ age_bucket_p.T.astype(float) > 0).astype(float)
 
         return patient_index, patient_map, competence_m_p
 
@@ -265,37 +351,20 @@ class Loader(object):
         if (len(local_values) % WEEK_SIZE) != 0:
             self.error_missing_value("LocalPaciente", f"É necessário que exista um dia da semana para cada paciente.")
 
-        local_p_l_d = np.zeros(shape=(int(local_values.shape[0] / WEEK_SIZE), (local_values.shape[1] - 2), WEEK_SIZE))
-
-        disponible = dict()
-        patient_name = str()
-        for pa, row in enumerate(local_values):
-            if row[0]:
-                patient_name = row[0]
-                disponible[patient_name] = list()
-
-            patient_index = pa // WEEK_SIZE
-            d = pa % WEEK_SIZE
-
-            disp_in_week = False
-
-            for l, col in enumerate(local_header[2:]):
+        # INFO: One block of WEEK_SIZE rows per patient, reshaped into (patient, day, local).
+        available = local_values[:, 2:] != 0
 
-                if row[(l + 2)] != 0:
-                    disp_in_week = True
+        local_p_d_l = available.reshape(-1, WEEK_SIZE, available.shape[1]).copy()
 
-                local_p_l_d[patient_index][l][d] = 1 if row[(l + 2)] != 0 else 0
+        # ===================================================
+        children = patient_values[:local_p_d_l.shape[0], 1].astype(float) < 12
+        local_p_d_l[children, :, 0] = False
+        # ===================================================
 
-                # ===================================================
-                if (l == 0) and (int(patient_values[patient_index][1]) < 12):
-                    local_p_l_d[patient_index][l][d] = 0
-                # ===================================================
+        local_p_l_d = local_p_d_l.transpose(0, 2, 1).astype(float)
 
-            disponible[patient_name].append(disp_in_week)
-
-        for pa, disps in disponible.items():
-            if not any(disps):
-                self.warning_message("LocalPaciente", f"O paciente {pa} não possui locais disponíveis. Não será alocado.")
+        for pa in self.unavailable_names(local_values[:, 0], available):
+            self.warning_message("LocalPaciente", f"O paciente {pa} não possui locais disponíveis. Não será alocado.")
 
         return local_p_l_d
 
@@ -317,32 +386,12 @@ class Loader(object):
         if (len(dispon_values) % WEEK_SIZE) != 0:
             self.error_missing_value("DisponPaciente", f"É necessário que exista um dia da semana para cada paciente.")
 
-        hour_p_d_h = np.zeros(shape=(int(dispon_values.shape[0] / WEEK_SIZE), WEEK_SIZE, HOUR_PER_DAY))
-
-        disponible = dict()
-        patient_name = str()
-        for pa, row in enumerate(dispon_values):
-            if row[0]:
-                patient_name = row[0]
-                disponible[patient_name] = list()
-
-            patient_index = pa // WEEK_SIZE
-            d = pa % WEEK_SIZE
-
-            disp_in_week = False
+        available = dispon_values[:, 2:] != 0
 
-            for h, col in enumerate(dispon_header[2:]):
+        hour_p_d_h = self.week_blocks(available)
 
-                if row[(h + 2)] != 0:
-                    disp_in_week = True
-
-                hour_p_d_h[patient_index][d][h] = 1 if row[(h + 2)] != 0 else 0
-
-            disponible[patient_name].append(disp_in_week)
-
-        for pa, disps in disponible.items():
-            if not any(disps):
-                self.warning_message("DisponPaciente", f"O paciente {pa} não possui horas disponíveis. Não será alocado.")
+        for pa in self.unavailable_names(dispon_values[:, 0], available):
+            self.warning_message("DisponPaciente", f"O paciente {pa} não possui horas disponíveis. Não será alocado.")
 
         return hour_p_d_h
 
@@ -364,37 +413,40 @@ class Loader(object):
         if (len(dispon_values) % WEEK_SIZE) != 0:
             self.error_missing_value("DisponProfissional", f"É necessário que exista um dia da semana para cada profissional.")
 
-        hour_p_d_h = np.zeros(shape=(int(dispon_values.shape[0] / WEEK_SIZE), WEEK_SIZE, HOUR_PER_DAY))
+        available = dispon_values[:, 2:] != 0
 
-        disponible = dict()
-        professional_name = str()
-        for pr, row in enumerate(dispon_values):
-            if row[0]:
-                professional_name = row[0]
-                disponible[professional_name] = list()
+        hour_p_d_h = self.week_blocks(available)
 
-            professional_index = pr // WEEK_SIZE
-            d = pr % WEEK_SIZE
+        for pr in self.unavailable_names(dispon_values[:, 0], available):
+            self.warning_message(
+                "DisponProfissional",
+                f"O profissional {pr} não possui horas disponíveis. Não será alocado."
+            )
 
-            disp_in_week = False
+        return hour_p_d_h
 
-            for h, col in enumerate(dispon_header[2:]):
+    def week_blocks(self, available: np.ndarray) -> np.ndarray:
+        # INFO: One block of WEEK_SIZE rows per entity, reshaped into (entity, day, hour).
+        blocks = available.reshape(-1, WEEK_SIZE, available.shape[1])
 
-                if row[(h + 2)] != 0:
-                    disp_in_week = True
+        hour_d_h = np.zeros(shape=(blocks.shape[0], WEEK_SIZE, HOUR_PER_DAY))
+        hour_d_h[:, :, :blocks.shape[2]] = blocks
 
-                hour_p_d_h[professional_index][d][h] = 1 if row[(h + 2)] != 0 else 0
+        return hour_d_h
 
-            disponible[professional_name].append(disp_in_week)
+    def unavailable_names(self, names: np.ndarray, available: np.ndarray) -> list:
+        # INFO: Rows without a name belong to the named row above them. A repeated name keeps
+        #       the position of its first block and the availability of its last one.
+        starts = np.flatnonzero(names.astype(bool))
 
-        for pr, disps in disponible.items():
-            if not any(disps):
-                self.warning_message(
-                    "DisponProfissional",
-                    f"O profissional {pr} não possui horas disponíveis. Não será alocado."
-                )
+        if not len(starts):
+            return list()
 
-        return hour_p_d_h
+        block_available = np.logical_or.reduceat(available.any(axis=1), starts)
+
+        last_block = pd.Series(block_available, index=names[starts]).groupby(level=0, sort=False).last()
+
+        return last_block.index[~last_block.to_numpy()].tolist()
 
     def missing_column(self, table: str, col: str):
         self.errors.append({
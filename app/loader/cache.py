@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+
+from app.loader import ingest
+
+
+# INFO: Bump whenever Loader.load changes what it returns for the same sheets.
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+RELATIONSHIP = re.compile(rb'<(?:\w+:)?Relationship\b[^>]*?>')
+SHEET = re.compile(rb'<(?:\w+:)?sheet\b[^>]*?>')
+ATTRIBUTE = re.compile(rb'([\w:]+)\s*=\s*"([^"]*)"')
+SHARED_STRING = re.compile(rb'<(?:\w+:)?si\b(?:[^>]*?/>|.*?</(?:\w+:)?si>)', re.DOTALL)
+# INFO: Anchored on the attribute so the scan is fast, matching more than cells only adds to the key.
+SHARED_CELL = re.compile(rb't="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
+STYLE_INDEX = re.compile(rb' s="(\d+)"')
+CELL_XFS = re.compile(rb'<(?:\w+:)?cellXfs\b.*?</(?:\w+:)?cellXfs>', re.DOTALL)
+XF = re.compile(rb'<(?:\w+:)?xf\b[^>]*>')
+NUM_FMT = re.compile(rb'<(?:\w+:)?numFmt\b[^>]*>')
+
+
+def default_directory() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(base, "agendador-pacientes", "instances")
+
+def attributes(tag: bytes) -> dict:
+    return { name.split(b":")[-1].decode(): value.decode() for name, value in ATTRIBUTE.findall(tag) }
+
+def workbook_key(file_path: str, sheet_names: list[str]) -> str:
+    # DESCRIPTION: Hash of everything the input sheets are parsed from, the output sheets are left out.
+    digest = hashlib.sha256(f"{CACHE_VERSION}:{ingest.python_calamine is not None}".encode())
+
+    with zipfile.ZipFile(file_path) as archive:
+        members = set(archive.namelist())
+
+        workbook = archive.read("xl/workbook.xml")
+        targets = {
+            attrs["Id"]: attrs["Target"]
+            for attrs in map(attributes, RELATIONSHIP.findall(archive.read("xl/_rels/workbook.xml.rels")))
+        }
+
+        sheet_paths = dict()
+
+        for attrs in map(attributes, SHEET.findall(workbook)):
+            target = targets.get(attrs.get("id"), "")
+            sheet_paths[attrs.get("name")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+
+        # INFO: Dates are read differently on 1904 based workbooks.
+        digest.update(b"1904" if re.search(rb'date1904="(1|true)"', workbook) else b"1900")
+
+        shared_strings = SHARED_STRING.findall(archive.read("xl/sharedStrings.xml")) if "xl/sharedStrings.xml" in members else list()
+
+        styles = archive.read("xl/styles.xml") if "xl/styles.xml" in members else b""
+        cell_xfs = CELL_XFS.search(styles)
+        xfs = XF.findall(cell_xfs.group(0)) if cell_xfs else list()
+        num_fmts = { attrs.get("numFmtId"): attrs.get("formatCode") for attrs in map(attributes, NUM_FMT.findall(styles)) }
+
+        for name in sheet_names:
+            digest.update(name.encode())
+
+            if sheet_paths.get(name) not in members:
+                digest.update(b"\0missing")
+                continue
+
+            sheet = archive.read(sheet_paths[name])
+            digest.update(hashlib.sha256(sheet).digest())
+
+            # INFO: Only the shared strings and number formats used by this sheet take part in the key.
+            for index in sorted(set(map(int, SHARED_CELL.findall(sheet)))):
+                digest.update(shared_strings[index] if index < len(shared_strings) else b"\0")
+
+            for index in sorted(set(map(int, STYLE_INDEX.findall(sheet)))):
+                num_fmt_id = attributes(xfs[index]).get("numFmtId") if index < len(xfs) else None
+                digest.update(f"{index}:{num_fmt_id}:{num_fmts.get(num_fmt_id)}".encode())
+
+    return digest.hexdigest()
+
+def plain(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+
+    if not isinstance(value, (str, int, float)):
+        raise TypeError(f"{type(value).__name__} is not cacheable")
+
+    return value
+
+class InstanceCache(object):
+
+    def __init__(self, directory: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+
+    def key(self, file_path: str, sheet_names: list[str]) -> str:
+        return workbook_key(file_path, sheet_names)
+
+    def get(self, key: str) -> tuple[dict, list] | None:
+        entry = os.path.join(self.directory, key)
+        sidecar = os.path.join(entry, "meta.json")
+
+        try:
+            with open(sidecar, encoding="utf-8") as f:
+                meta = json.load(f)
+
+            response = {
+                name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r") for name in meta["arrays"]
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+
+        for name, values in meta["maps"].items():
+            response[name] = { int(i): value for i, value in values }
+
+        # INFO: The sidecar modification time is the LRU clock.
+        try:
+            os.utime(sidecar)
+        except OSError:
+            pass
+
+        return response, meta["errors"]
+
+    def put(self, key: str, response: dict, errors: list):
+        arrays = { name: value for name, value in response.items() if isinstance(value, np.ndarray) }
+        maps = { name: value for name, value in response.items() if isinstance(value, dict) }
+
+        if len(arrays) + len(maps) != len(response):
+            return
+
+        try:
+            maps = { name: [ [ int(i), plain(value) ] for i, value in values.items() ] for name, values in maps.items() }
+        except TypeError:
+            # INFO: Names that do not survive JSON (dates, for example) are not cached at all.
+            return
+
+        sidecar = json.dumps({ "arrays": list(arrays), "maps": maps, "errors": errors }, ensure_ascii=False)
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # INFO: Written aside and renamed, so a reader never sees half an entry.
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+
+        try:
+            for name, value in arrays.items():
+                np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(value), allow_pickle=False)
+
+            with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+                f.write(sidecar)
+
+            os.replace(staging, os.path.join(self.directory, key))
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def pointer(self, file_path: str) -> str:
+        name = hashlib.sha256(os.path.abspath(file_path).encode()).hexdigest()
+
+        return os.path.join(self.directory, "files", name)
+
+    def last(self, file_path: str) -> str | None:
+        # DESCRIPTION: Key of the instance loaded the last time this workbook was read.
+        try:
+            with open(self.pointer(file_path), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def remember(self, file_path: str, key: str):
+        try:
+            os.makedirs(os.path.dirname(self.pointer(file_path)), exist_ok=True)
+
+            with open(self.pointer(file_path), "w", encoding="utf-8") as f:
+                f.write(key)
+        except OSError:
+            pass
+
+    def evict(self):
+        entries = list()
+
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+
+            # INFO: The per workbook pointers have no meta.json and are skipped below.
+            try:
+                sizes = [ os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry) ]
+                last_used = os.path.getmtime(os.path.join(entry, "meta.json"))
+            except OSError:
+                continue
+
+            entries.append((last_used, sum(sizes), entry))
+
+        total = sum(size for _, size, _ in entries)
+
+        # DESCRIPTION: Least recently used entries go first until the cache fits.
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -0,0 +1,93 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+import openpyxl
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+
+def read_sheets(file_path: str, sheet_names: list[str]) -> dict[str, pd.DataFrame]:
+    # DESCRIPTION: Open the workbook once and read only the requested sheets that exist.
+    if python_calamine is not None:
+        with pd.ExcelFile(file_path, engine="calamine") as workbook:
+            return {
+                name: workbook.parse(name) for name in sheet_names if name in workbook.sheet_names
+            }
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+
+    try:
+        data = dict()
+
+        for name in sheet_names:
+            if name not in workbook.sheetnames:
+                continue
+
+            sheet = workbook[name]
+
+            # INFO: The stored dimension can be wrong, read the cells that are really there.
+            sheet.reset_dimensions()
+
+            data[name] = sheet_frame(list(sheet.iter_rows(values_only=True)))
+
+        return data
+    finally:
+        workbook.close()
+
+def read_rows(file_path: str, sheet_name: str) -> list[tuple] | None:
+    # DESCRIPTION: Raw cell values of one sheet, for the output sheets that have no fixed header.
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+
+    try:
+        if sheet_name not in workbook.sheetnames:
+            return None
+
+        sheet = workbook[sheet_name]
+        sheet.reset_dimensions()
+
+        return [ row for row in sheet.iter_rows(values_only=True) if any(value is not None for value in row) ]
+    finally:
+        workbook.close()
+
+def sheet_frame(rows: list[tuple]) -> pd.DataFrame:
+    # INFO: Same shape as pd.read_excel: first row as header, trailing empty rows and columns dropped.
+    if not rows:
+        return pd.DataFrame()
+
+    values = pd.DataFrame.from_records(rows).to_numpy(dtype=object)
+
+    filled = pd.notna(values) & (values != "")
+
+    if not filled.any():
+        return pd.DataFrame()
+
+    n_rows = np.flatnonzero(filled.any(axis=1))[-1] + 1
+    n_columns = np.flatnonzero(filled.any(axis=0))[-1] + 1
+
+    # INFO: Empty cells and empty strings are NaN, as read_excel parses them.
+    values[~filled] = np.nan
+    values = values[:n_rows, :n_columns]
+
+    return pd.DataFrame(
+        values[1:], columns=header_names(values[0].tolist())
+    ).infer_objects()
+
+def header_names(header: list) -> list:
+    names = [ f"Unnamed: {i}" if pd.isna(name) else name for i, name in enumerate(header) ]
+
+    # INFO: Repeated names become "name.1", "name.2", ... as pandas does.
+    seen = collections.Counter()
+
+    for i, name in enumerate(names):
+        count = seen[name]
+        seen[name] += 1
+
+        if count:
+            names[i] = f"{name}.{count}"
+
+    return names
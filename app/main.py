@@ -1,5 +1,11 @@
 import logging
 
+import multiprocessing
+
+import os
+
+import queue
+
 import threading
 
 import time
@@ -17,8 +23,12 @@ import tkinter.messagebox
 import pulp
 
 from app.loader.Loader import Loader
+from app.loader.cache import InstanceCache
+from app.metrics import Metrics
 from app.model.Model import Model
-from app.export.excel import save_errors, save_output, clear_past_output
+from app.model.control import SolveControl, progress_message
+from app.model.profiles import DEFAULT_PROFILE, PROFILES
+from app.export import export_formats, open_session
 
 
 class InfiniteThread(threading.Thread):
@@ -34,23 +44,76 @@ class InfiniteThread(threading.Thread):
 
         return output
 
+# INFO: Lines kept in the log widget, the oldest ones are dropped.
+MAX_LOG_LINES = 5000
+
+# INFO: Items applied per pump tick, so a burst of records never blocks the Tk loop for long.
+MAX_PUMP_BATCH = 1000
+
+# INFO: Milliseconds between two pump ticks.
+PUMP_INTERVAL = 100
+
+
 class TkLoggerHandler(logging.Handler):
 
-    def __init__(self, text: tk.Text, level = 0):
+    # DESCRIPTION: Tk widgets are only safe to touch from the main thread, so the worker only queues
+    #              its log records and widget updates (call) and the main thread applies them (drain).
+    def __init__(self, text: tk.Text, level = 0, max_lines: int = MAX_LOG_LINES):
         self.text = text
+        self.max_lines = max_lines
+        self.queue = queue.SimpleQueue()
         super().__init__(level)
 
     def emit(self, record: logging.LogRecord):
-        msg = self.format(record)
+        # INFO: Formatting is also left to the main thread, the worker only pays for the put.
+        self.queue.put(record)
+
+    def call(self, function: t.Callable, *args, **kwargs):
+        self.queue.put((function, args, kwargs))
+
+    def start(self):
+        self.text.after(PUMP_INTERVAL, self.drain)
+
+    def drain(self):
+        lines = list()
+
+        try:
+            for _ in range(MAX_PUMP_BATCH):
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if isinstance(item, logging.LogRecord):
+                    lines.append(self.format(item))
+                    continue
+
+                # INFO: The lines before a widget update are shown before it happens.
+                self.write(lines)
+                lines = list()
+
+                function, args, kwargs = item
+                function(*args, **kwargs)
+        finally:
+            self.write(lines)
+            self.text.after(PUMP_INTERVAL, self.drain)
+
+    def write(self, lines: list[str]):
+        if not lines:
+            return
 
         self.text.config(state=tk.NORMAL)
-        self.text.insert(tk.END, msg + '\n')
+        self.text.insert(tk.END, '\n'.join(lines) + '\n')
+
+        excess = int(self.text.index('end-1c').split('.')[0]) - 1 - self.max_lines
+
+        if excess > 0:
+            self.text.delete('1.0', f'{excess + 1}.0')
+
         self.text.config(state=tk.DISABLED)
         self.text.yview(tk.END)
-        self.text.update()
 
-def create_logger(text: tk.Text, fmt: str = '%(asctime)s: %(message)s'):
-    handler = TkLoggerHandler(text=text)
+def create_logger(handler: TkLoggerHandler, fmt: str = '%(asctime)s: %(message)s'):
 
     formatter = logging.Formatter(fmt=fmt, datefmt='%Y-%m-%d %H:%M:%S')
 
@@ -99,47 +162,92 @@ def main():
     message_title = tk.Label(master=window, text="Processamento")
     message = tk.Text(master=window, state='disabled')
 
-    logger = create_logger(text=message)
+    handler = TkLoggerHandler(text=message)
+    logger = create_logger(handler)
 
-    loader = Loader(logger=logger)
+    loader = Loader(logger=logger, cache=InstanceCache())
 
     def set_file_path(path):
         loader.file_path = path
 
     selector_frame = create_file_selector(master=window, on_file_selected=set_file_path)
 
+    profile_frame = tk.Frame(window)
+    profile_label = tk.Label(master=profile_frame, text="Perfil: ")
+    profile_selector = tkinter.ttk.Combobox(master=profile_frame, values=list(PROFILES), state="readonly")
+    profile_selector.set(DEFAULT_PROFILE)
+
+    export_label = tk.Label(master=profile_frame, text="Saída: ")
+    export_selector = tkinter.ttk.Combobox(master=profile_frame, values=export_formats(), state="readonly")
+    export_selector.set("excel")
+
+    incremental = tk.BooleanVar(master=profile_frame, value=False)
+    incremental_check = tk.Checkbutton(master=profile_frame, text="Manter agendamento anterior", variable=incremental)
+
+    stream_schedule = tk.BooleanVar(master=profile_frame, value=False)
+    stream_schedule_check = tk.Checkbutton(master=profile_frame, text="Agenda em arquivo separado", variable=stream_schedule)
+
+    profile_label.grid(row=0, column=0)
+    profile_selector.grid(row=0, column=1)
+    export_label.grid(row=0, column=2)
+    export_selector.grid(row=0, column=3)
+    incremental_check.grid(row=0, column=4)
+    stream_schedule_check.grid(row=0, column=5)
+
     progress_bar = tkinter.ttk.Progressbar(window, maximum=4)
+    progress_label = tk.Label(master=window, text="")
 
     proccess_btn: tk.Button
+    cancel_btn: tk.Button
 
-    def process():
-        if not loader.file_path:
-            tkinter.messagebox.showerror("Erro ao realizar agendamento.", "Por favor, selecione um arquivo.")
-            return
+    # INFO: Options read on the main thread when the run starts, and the control of its solver.
+    selected = dict()
 
-        proccess_btn["state"] = "disabled"
-        progress_bar["value"] = 1
-        window.update()
+    def set_progress(value: int):
+        handler.call(progress_bar.configure, value=value)
 
-        clear_past_output(loader.file_path)
+    def show_solver_progress(progress: dict):
+        handler.call(progress_label.configure, text=progress_message(progress))
 
+    def process():
         logger.info(f"Carregando arquivo: {loader.file_path}")
 
+        # INFO: Fresh for every run, the loader is shared between them.
+        metrics = Metrics()
+        loader.metrics = metrics
+
+        output = None
+        changes = None
+
         try:
             data = loader.load()
 
-            progress_bar["value"] = 2
-            window.update()
+            set_progress(2)
 
             logger.info("Realizando agendamento, este processo pode levar algum tempo, por favor, aguarde.")
 
-            model = Model(logger=logger)
+            # INFO: The CBC threads default to the cores, Model splits them among the component workers.
+            model = Model(logger=logger, workers=os.cpu_count() or 1, profile=selected["profile"], metrics=metrics, control=selected["control"])
+
+            if selected["incremental"]:
+                solution, status, time_elapsed = model.reoptimize(data, loader.load_solution(data), loader.previous_instance())
+                changes = model.changes
+            else:
+                solution, status, time_elapsed = model.optimze(data)
 
-            solution, status, time_elapsed = model.optimze(data)
+            if selected["control"].cancelled:
+                logger.info("Agendamento cancelado, a melhor solução encontrada até agora será salva.")
+
+            # INFO: Doctors and patients left out of the model go to the Inconsistência sheet.
+            loader.errors.extend(model.diagnostics)
+
+            for diagnostic in model.diagnostics:
+                logger.info(diagnostic["message"])
 
             map_status_to_message = {
                 "Not Solved": "Não Resolvido",
                 "Optimal": "Ótimo",
+                "Feasible": "Viável",
                 "Infeasible": "Inviável",
                 "Unbounded": "Ilimitado",
                 "Undefined": "Indefinido"
@@ -148,52 +256,125 @@ def main():
             logger.info(f"Resultado do processamento: {map_status_to_message[status]}.")
             logger.info(f"Tempo gasto: {time_elapsed:.2f} segundos.")
 
+            if model.stats.get("gap") is not None:
+                logger.info(f"Gap até o ótimo: {100 * model.stats['gap']:.2f}%.")
+
             logger.debug(status)
             logger.debug(solution)
 
-            if status == "Optimal":
-                logger.info("Salvando resultados.")
-
-                save_output(loader.file_path, data, solution, logger=logger)
+            if status in ("Optimal", "Feasible"):
+                output = (data, solution)
 
-                progress_bar["value"] = 3
-                window.update()
-
-            progress_bar["value"] = 4
+            set_progress(3)
         except zipfile.BadZipFile:
             logger.info("O carregamento falhou, por favor verifique se o arquivo excel está corrompido.")
-            progress_bar["value"] = 0
+            set_progress(0)
         except Exception:
             logger.debug("ERROR:", exc_info=True)
 
             logger.info("O processamento falhou, por favor verifique os erros.")
 
-            progress_bar["value"] = 0
+            set_progress(0)
 
+        # INFO: Results and errors go to the export target in a single load and save.
         try:
-            logger.info("Salvando os erros.")
-            save_errors(loader.file_path, loader.errors, logger=logger)
+            with metrics.phase("export"):
+                session = open_session(loader.file_path, export_format=selected["export_format"], logger=logger, stream_schedule=selected["stream_schedule"])
+                session.clear_output()
+
+                if output is not None:
+                    logger.info("Salvando resultados.")
+
+                    try:
+                        session.write_output(*output)
+
+                        if changes is not None:
+                            session.write_changes(data, changes)
+                    except Exception:
+                        logger.debug("ERROR:", exc_info=True)
+                        logger.info("O programa falhou ao salvar os resultados, por favor verifique os erros.")
+
+                        session.clear_output()
+
+                session.write_metrics(metrics)
+
+                logger.info("Salvando os erros.")
+                session.write_errors(loader.errors)
+                session.save()
+
+            for line in metrics.report():
+                logger.info(line)
+
+            if output is not None:
+                set_progress(4)
         except zipfile.BadZipFile:
             logger.info("O programa falhou ao salvar os errors, por favor verifique se o arquivo excel está corrompido.")
+        except Exception:
+            logger.debug("ERROR:", exc_info=True)
+            logger.info("O programa falhou ao salvar a planilha, verifique se ela não está aberta em outro programa.")
+
+        selected["control"].close()
 
-        tkinter.messagebox.showinfo("Agendamento concluído", "O agendamento foi finalizado, o programa pode ser finalizado.")
+        handler.call(tkinter.messagebox.showinfo, "Agendamento concluído", "O agendamento foi finalizado, o programa pode ser finalizado.")
+        handler.call(cancel_btn.configure, state="disabled")
+        handler.call(proccess_btn.configure, state="normal")
 
-        proccess_btn["state"] = "normal"
-        window.update()
+    worker = InfiniteThread(target=process)
+
+    def start():
+        if not loader.file_path:
+            tkinter.messagebox.showerror("Erro ao realizar agendamento.", "Por favor, selecione um arquivo.")
+            return
+
+        selected.update(
+            profile=profile_selector.get(),
+            export_format=export_selector.get(),
+            incremental=incremental.get(),
+            stream_schedule=stream_schedule.get(),
+            control=SolveControl(on_progress=show_solver_progress)
+        )
+
+        proccess_btn["state"] = "disabled"
+        cancel_btn["state"] = "normal"
+        progress_bar["value"] = 1
+        progress_label["text"] = ""
+
+        worker.start()
+
+    def cancel():
+        # INFO: The solver stops with the best schedule found so far, which is still saved.
+        selected["control"].cancel()
+        cancel_btn["state"] = "disabled"
+
+        logger.info("Cancelando o agendamento, aguarde.")
 
     proccess_btn = tk.Button(
         text="Agendar",
         width=window.winfo_width(),
-        command=InfiniteThread(target=process).start
+        command=start
+    )
+
+    cancel_btn = tk.Button(
+        text="Cancelar",
+        width=window.winfo_width(),
+        command=cancel,
+        state="disabled"
     )
 
     selector_frame.grid(row=0)
-    message_title.grid(row=1, sticky="news", padx=0)
-    message.grid(row=2, sticky="news", padx=0)
-    progress_bar.grid(row=3, sticky="nesw", padx=0)
-    proccess_btn.grid(row=4, sticky="nesw", padx=0)
+    profile_frame.grid(row=1)
+    message_title.grid(row=2, sticky="news", padx=0)
+    message.grid(row=3, sticky="news", padx=0)
+    progress_bar.grid(row=4, sticky="nesw", padx=0)
+    progress_label.grid(row=5, sticky="nesw", padx=0)
+    proccess_btn.grid(row=6, sticky="nesw", padx=0)
+    cancel_btn.grid(row=7, sticky="nesw", padx=0)
+
+    handler.start()
 
     window.mainloop()
 
 if __name__ == "__main__":
+    # INFO: Required by the solver process pool inside the PyInstaller executable.
+    multiprocessing.freeze_support()
     main()
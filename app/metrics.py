@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# INFO: Entries of Model.stats reported with the phases.
+MODEL_STATISTICS = [ "variables", "constraints", "nonzeros", "greedy", "objective", "bound", "gap", "nodes" ]
+
+PHASE_NAMES = {
+    "load": "carregamento",
+    "presolve": "pré-processamento",
+    "build": "construção do modelo",
+    "solve": "resolução",
+    "export": "exportação",
+    "process": "processo",
+    "model": "modelo",
+}
+
+# INFO: Columns written by each measure of a phase, of the process and of the model.
+MEASURE_NAMES = {
+    "wall_time": "tempo",
+    "cpu_time": "tempo_cpu",
+    "peak_memory": "memoria_maxima_etapa",
+    "process_peak_memory": "memoria_maxima_processo",
+    "solver_peak_memory": "memoria_maxima_resolvedor",
+    "variables": "variaveis",
+    "constraints": "restricoes",
+    "nonzeros": "coeficientes",
+    "greedy": "solucao_gulosa",
+    "objective": "consultas",
+    "bound": "limitante",
+    "gap": "gap",
+    "nodes": "nos",
+}
+
+METRICS_COLUMNS = [ "etapa", "medida", "valor" ]
+
+
+def cpu_time() -> float:
+    # INFO: This process and the finished child processes, CBC runs in one of them.
+    times = os.times()
+
+    return time.process_time() + times.children_user + times.children_system
+
+def process_peak_memory(who: int | None = None) -> int | None:
+    # INFO: High-water mark of the resident memory in bytes over the whole life of the process (or of
+    #       every child waited for), unknown where there is no getrusage (Windows).
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who)
+
+    return usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+class Phase(object):
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = cpu_time()
+
+        # INFO: The phases never nest, so the peak can be reset for each one.
+        if self.metrics.trace_memory:
+            self.started_tracing = not tracemalloc.is_tracing()
+
+            if self.started_tracing:
+                tracemalloc.start()
+
+            tracemalloc.reset_peak()
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+
+        return self
+
+    def __exit__(self, *exc_info):
+        peak_memory = None
+
+        if self.metrics.trace_memory:
+            peak_memory = max(tracemalloc.get_traced_memory()[1] - self.memory_start, 0)
+
+            if self.started_tracing:
+                tracemalloc.stop()
+
+        self.metrics.record(self.name, time.perf_counter() - self.wall_start, cpu_time() - self.cpu_start, peak_memory)
+
+        return False
+
+class Metrics(object):
+
+    # DESCRIPTION: Wall time, CPU time and, with trace_memory, the peak memory each phase of a run
+    #              allocated (tracemalloc, which makes loading several times slower), and the
+    #              statistics of its model.
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.phases = dict()
+        self.model = dict()
+
+    def phase(self, name: str) -> Phase:
+        return Phase(self, name)
+
+    def record(self, name: str, wall_time: float, cpu_time: float, peak_memory: int | None = None):
+        # INFO: A phase run more than once (one per component or week) adds up, the memory keeps its maximum.
+        phase = self.phases.setdefault(name, { "wall_time": 0.0, "cpu_time": 0.0, "peak_memory": None, "calls": 0 })
+
+        phase["wall_time"] += wall_time
+        phase["cpu_time"] += cpu_time
+        phase["calls"] += 1
+
+        if peak_memory is not None:
+            phase["peak_memory"] = max(phase["peak_memory"] or 0, peak_memory)
+
+    def set_model(self, stats: dict):
+        self.model = { key: stats.get(key) for key in MODEL_STATISTICS }
+
+    def process(self) -> dict:
+        # INFO: Not of any phase nor even of this run, a GUI keeps the marks of its earlier runs. On
+        #       Linux the children mark also counts what CBC shared with this process before exec.
+        return {
+            "process_peak_memory": process_peak_memory(),
+            "solver_peak_memory": process_peak_memory(resource.RUSAGE_CHILDREN) if resource is not None else None,
+        }
+
+    def as_dict(self) -> dict:
+        return {
+            "phases": { name: dict(phase) for name, phase in self.phases.items() },
+            "process": self.process(),
+            "model": dict(self.model),
+        }
+
+    def rows(self) -> list[list]:
+        # DESCRIPTION: Rows of METRICS_COLUMNS, one per known measure of each phase, then of the process and of the model.
+        rows = [
+            [ PHASE_NAMES[name], MEASURE_NAMES[key], phase[key] ]
+            for name, phase in self.phases.items()
+            for key in ("wall_time", "cpu_time", "peak_memory")
+            if phase[key] is not None
+        ]
+
+        for group, values in (("process", self.process()), ("model", self.model)):
+            rows += [ [ PHASE_NAMES[group], MEASURE_NAMES[key], value ] for key, value in values.items() if value is not None ]
+
+        return rows
+
+    def report(self) -> list[str]:
+        lines = list()
+
+        for name, phase in self.phases.items():
+            line = f"Etapa {PHASE_NAMES.get(name, name)}: {phase['wall_time']:.2f}s (CPU {phase['cpu_time']:.2f}s)"
+
+            if phase["peak_memory"] is not None:
+                line += f", pico de {phase['peak_memory'] / 2 ** 20:.1f} MB alocados"
+
+            lines.append(line + ".")
+
+        process = self.process()
+
+        if process["process_peak_memory"] is not None:
+            lines.append(
+                f"Memória máxima do programa desde que foi aberto: {process['process_peak_memory'] / 2 ** 20:.1f} MB, "
+                f"do resolvedor: {(process['solver_peak_memory'] or 0) / 2 ** 20:.1f} MB."
+            )
+
+        model = self.model
+
+        if model.get("variables") is not None:
+            lines.append(f"Modelo: {model['variables']} variáveis, {model['constraints']} restrições e {model['nonzeros']} coeficientes não nulos.")
+
+        if model.get("objective") is not None:
+            line = f"Consultas: {model['objective']}"
+
+            if model.get("greedy") is not None:
+                line += f", solução inicial gulosa com {model['greedy']}"
+
+            if model.get("gap") is not None:
+                line += f", gap de {100 * model['gap']:.2f}%"
+
+            lines.append(line + ".")
+
+        return lines
@@ -1,17 +1,153 @@
+import concurrent.futures
+import contextlib
 import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
 
 import itertools as it
 
+from collections import defaultdict
+
 import pulp
 
 import numpy as np
 
+from app.metrics import Metrics
+from app.model.aggregation import aggregate_params, aggregate_solution, disaggregate_solution, patient_capacity, patient_classes
+from app.model.cbc import parse_log, relative_gap
+from app.model.control import SolveControl
+from app.model.decomposition import components
+from app.model.feasibility import check_solution, feasible_tuples, is_feasible
+from app.model.flow import location_rule_binds, solve_flow
+from app.model.heuristic import warm_start
+from app.model.incremental import changed_entities, preference_weights, residual_problem, solution_changes
+from app.model.horizon import rolling_horizon
+from app.model.instance import expand_solution, restrict_solution, subset_params
+from app.model.matrix import MatrixModel
+from app.model.presolve import binding_doctors, binding_slots, diagnostics, presolve, upper_bound
+from app.model.profiles import DEFAULT_PROFILE, get_profile
+
+
+# INFO: Logged when CBC ends below the greedy warm start, which is then kept.
+GREEDY_KEPT_MESSAGE = "O resolvedor não melhorou a solução inicial gulosa, ela será mantida."
+
 class Model(object):
 
-    def __init__(self, logger: logging.Logger):
+    def __init__(
+            self,
+            logger: logging.Logger,
+            sparse: bool = True,
+            location: str = "indicator",
+            threads: int | None = None,
+            decompose: bool = True,
+            workers: int = 1,
+            backend: str = "auto",
+            profile: str | dict = DEFAULT_PROFILE,
+            deadline: float | None = None,
+            builder: str = "matrix",
+            aggregate: bool = True,
+            metrics: Metrics | None = None,
+            control: SolveControl | None = None
+        ):
         self.logger = logger
-
-    def optimze(self, params: dict) -> tuple[np.ndarray, str, float]:
+        # INFO: When sparse, only the feasible (m, p, d, h, l) tuples become variables.
+        self.sparse = sparse
+        # INFO: "indicator" links the assignments to one y[m, d, l] per physical location,
+        #       "pairwise" keeps one row per pair of physical locations.
+        self.location = location
+        # INFO: Time limit, relative gap, threads and seed given to CBC, see app.model.profiles.
+        self.profile = get_profile(profile, threads=threads)
+        # INFO: Wall-clock instant (time.time) after which no solve may continue, shared by components.
+        self.deadline = deadline
+        # INFO: Solve each independent doctor-patient component as its own MIP, in `workers` processes.
+        self.decompose = decompose
+        self.workers = workers
+        # INFO: "cbc" always builds the MIP, "flow" always uses max-flow (relaxing and repairing
+        #       the location rule when it binds), "auto" uses max-flow only when it is exact.
+        self.backend = backend
+        # INFO: "matrix" writes the constraint matrix straight from index arrays (app.model.matrix),
+        #       "pulp" builds LpVariable objects. Both solve the same MIP with CBC, the dense
+        #       formulation only exists in the PuLP one.
+        self.builder = builder
+        # INFO: Solve interchangeable patients as one row per class (see app.model.aggregation).
+        self.aggregate = aggregate
+        # INFO: Statistics of the last optimze call (objective, bound, gap, greedy).
+        self.stats = dict()
+        # INFO: Appointments changed by the last reoptimize call, see incremental.solution_changes.
+        self.changes = None
+        # INFO: Inconsistência rows of the doctors and patients the last optimze call left out (see app.model.presolve).
+        self.diagnostics = list()
+        # INFO: Time and memory of the presolve, build and solve phases, added up over every call.
+        self.metrics = metrics if metrics is not None else Metrics()
+        # INFO: Cancels the CBC runs, keeping the best schedule found, and receives their progress.
+        self.control = control
+        # INFO: Schedule the warm start begins from, given to optimze (see app.model.horizon).
+        self.start = None
+        # INFO: (params, feasible tuples) of the last instance asked for, see feasible_tuples.
+        self.tuples = None
+
+    def feasible_tuples(self, params: dict) -> np.ndarray:
+        # INFO: Presolve, decomposition, backend choice and build all need the tuples of the same
+        #       instance. An instance is never changed once built, so it is known by identity.
+        if self.tuples is None or self.tuples[0] is not params:
+            self.tuples = (params, feasible_tuples(params))
+
+        return self.tuples[1]
+
+    def options(self) -> dict:
+        return {
+            "sparse": self.sparse,
+            "location": self.location,
+            "backend": self.backend,
+            "builder": self.builder,
+            "aggregate": self.aggregate,
+            "profile": self.profile,
+            "deadline": self.deadline,
+            "control": self.control,
+        }
+
+    def time_limit(self) -> float | None:
+        time_limit = self.profile["time_limit"]
+
+        if self.deadline is not None:
+            remaining = max(self.deadline - time.time(), 1.0)
+            time_limit = remaining if time_limit is None else min(time_limit, remaining)
+
+        return time_limit
+
+    def warm_start(self, params: dict, tuples: np.ndarray) -> np.ndarray:
+        hint = None
+
+        if self.start is not None and len(self.start):
+            hint = np.asarray(self.start, dtype=np.int64).reshape(-1, 5)
+            hint = hint[is_feasible(params, hint)]
+
+        greedy_sol = warm_start(params, tuples, hint=hint)
+
+        if self.location == "pairwise" and len(params['locals']) > 2:
+            # INFO: The pairwise rows allow a single physical appointment per (m, d) once
+            #       two physical locations exist, so the extra ones are left out.
+            greedy_m_d = greedy_sol[:, 0] * len(params['days']) + greedy_sol[:, 2]
+            restricted = np.flatnonzero(greedy_sol[:, 4] != 0)
+
+            _, first = np.unique(greedy_m_d[restricted], return_index=True)
+
+            keep = greedy_sol[:, 4] == 0
+            keep[restricted[first]] = True
+
+            greedy_sol = greedy_sol[keep]
+
+        self.logger.info(f"Solução inicial gulosa com {len(greedy_sol)} consultas.")
+
+        self.greedy_solution = greedy_sol
+        self.stats["greedy"] = len(greedy_sol)
+
+        return greedy_sol
+
+    def build(self, params: dict) -> tuple[pulp.LpProblem, dict]:
         M = params['doctors']
         P = params['patientes']
         L = params['locals']
@@ -24,7 +160,12 @@ class Model(object):
         dispon_m_d_h = params['dispon_m_d_h']
         dispon_p_d_h = params['dispon_p_d_h']
 
-        comb = list(it.product(M, P, D, H, L))
+        tuples = self.feasible_tuples(params)
+
+        if self.sparse:
+            comb = list(map(tuple, tuples.tolist()))
+        else:
+            comb = list(it.product(M, P, D, H, L))
 
         prob = pulp.LpProblem(name="Maximizar_Consultas", sense=pulp.LpMaximize)
 
@@ -35,124 +176,505 @@ class Model(object):
             cat='Binary'
         )
 
+        # INFO: Group the variables once so each family of restrictions only visits the existing tuples.
+        per_m = defaultdict(list)
+        per_m_d_h = defaultdict(list)
+        per_p = defaultdict(list)
+        per_m_d_l = defaultdict(list)
+        per_m_d_h_l = defaultdict(list)
+
+        for m, p, d, h, l in comb:
+            per_m[m].append(x1[m, p, d, h, l])
+            per_m_d_h[m, d, h].append(x1[m, p, d, h, l])
+            per_p[p].append(x1[m, p, d, h, l])
+            per_m_d_l[m, d, l].append(x1[m, p, d, h, l])
+            per_m_d_h_l[m, d, h, l].append(x1[m, p, d, h, l])
+
         # INFO: Objective Function
         prob += (pulp.lpSum(x1[m, p, d, h, l] for m, p, d, h, l in comb), "Total_Consultas")
 
         # INFO: Restrictions
 
+        # INFO: Rows the other restrictions already imply, see app.model.presolve.
+        if self.sparse:
+            doctor_rows = set(np.flatnonzero(binding_doctors(params, tuples)).tolist())
+            slot_rows = set(map(tuple, tuples[binding_slots(params, tuples)][:, [0, 2, 3]].tolist()))
+        else:
+            doctor_rows, slot_rows = set(per_m), set(per_m_d_h)
+
         # DESCRIPTION: Doctor's max availability.
-        for m in M:
-            prob += pulp.lpSum(
-                x1[m, p, d, h, l] for p in P for d in D for h in H for l in L
-            ) <= disp_m[m], f"disp_medico_{m}"
+        for m, variables in per_m.items():
+            if m in doctor_rows:
+                prob += pulp.lpSum(variables) <= disp_m[m], f"disp_medico_{m}"
 
         # INCLUDE
         # DESCRIPTION: Doctor's just one attends in each day-hour.
-        for m in M:
-            for d in D:
-                for h in H:
-                    prob += pulp.lpSum(
-                        x1[m, p, d, h, l] for p in P for l in L
-                    ) <= 1, f"max_consultas_medico_{m}_{d}_{h}"
+        for (m, d, h), variables in per_m_d_h.items():
+            if (m, d, h) in slot_rows:
+                prob += pulp.lpSum(variables) <= 1, f"max_consultas_medico_{m}_{d}_{h}"
 
         # DESCRIPTION: Each patient can consult a maximum of once per week.
-        for p in P:
-            prob += (
-                pulp.lpSum( x1[m, p, d, h, l] for m in M for d in D for h in H for l in L ) <= 1,
-                f"Max_consultas_paciente_{p}"
+        capacity = patient_capacity(params)
+
+        for p, variables in per_p.items():
+            prob += (pulp.lpSum(variables) <= capacity[p], f"Max_consultas_paciente_{p}")
+
+        # INFO: In the sparse formulation the infeasible tuples have no variable at all,
+        #       so the five families below would be empty.
+        if not self.sparse:
+            # DESCRIPTION: Doctor's competence.
+            for m, p, d, h, l in comb:
+                if competencia_m_p[m][p] == 0:
+                    prob += (x1[m, p, d, h, l] == 0, f"Competencia_{m}_{p}_{d}_{h}_{l}")
+
+            # DESCRIPTION:  Doctor's available schedule.
+            for m, p, d, h, l in comb:
+                if dispon_m_d_h[m][d][h] == 0: #CHANGE
+                    prob += (x1[m, p, d, h, l] == 0, f"Horario_disponivel_medico_{m}_{p}_{d}_{h}_{l}")
+
+            # DESCRIPTION: Doctor's available location.
+            for m, p, d, h, l in comb:
+                if local_m_l[m][l] == 0:
+                    prob += (x1[m, p, d, h, l] == 0, f"Local_disponivel_medico_{m}_{p}_{d}_{h}_{l}")
+
+            # DESCRIPTION: Patient's available schedule.
+            for m, p, d, h, l in comb:
+                if dispon_p_d_h[p][d][h] == 0:
+                    prob += (x1[m, p, d, h, l] == 0, f"Horario_disponivel_paciente_{m}_{p}_{d}_{h}_{l}")
+
+            # DESCRIPTION: Patient's available location.
+            for m, p, d, h, l in comb:
+                if local_p_l_d[p][l][d] == 0:
+                    prob += (x1[m, p, d, h, l] == 0, f"Local_disponivel_paciente_{m}_{p}_{d}_{h}_{l}")
+
+        # DESCRIPTION: A doctor can only attend to one physical location per day.
+        if self.location == "pairwise":
+            for m in M:
+                for d in D:
+                    for l1, l2 in it.combinations(L, 2):
+                        if (l1 == l2) or l1 == 0 or l2 == 0:
+                            continue
+
+                        variables = per_m_d_l[m, d, l1] + per_m_d_l[m, d, l2]
+
+                        if not variables:
+                            continue
+
+                        prob += (
+                            pulp.lpSum(variables) <= 1,
+                            f"Local_unico_medico_{m}_{d}_{l1}_{l2}"
+                        )
+
+            y = dict()
+        else:
+            physical_per_m_d = defaultdict(list)
+
+            for m, d, l in per_m_d_l.keys():
+                if l != 0:
+                    physical_per_m_d[m, d].append(l)
+
+            # INFO: Days with a single physical option do not need an indicator.
+            y = pulp.LpVariable.dicts(
+                "y",
+                ((m, d, l) for (m, d), locals_ in physical_per_m_d.items() if len(locals_) > 1 for l in locals_),
+                lowBound=0, upBound=1,
+                cat='Binary'
             )
 
-        # DESCRIPTION: Doctor's competence.
-        for m, p, d, h, l in comb:
-            if competencia_m_p[m][p] == 0:
-                prob += (x1[m, p, d, h, l] == 0, f"Competencia_{m}_{p}_{d}_{h}_{l}")
+            for (m, d, h, l), variables in per_m_d_h_l.items():
+                if (m, d, l) in y:
+                    prob += (pulp.lpSum(variables) <= y[m, d, l], f"Local_escolhido_medico_{m}_{d}_{h}_{l}")
 
-        # DESCRIPTION:  Doctor's available schedule.
-        for m, p, d, h, l in comb:
-            if dispon_m_d_h[m][d][h] == 0: #CHANGE
-                prob += (x1[m, p, d, h, l] == 0, f"Horario_disponivel_medico_{m}_{p}_{d}_{h}_{l}")
+            for (m, d), locals_ in physical_per_m_d.items():
+                if len(locals_) > 1:
+                    prob += (pulp.lpSum(y[m, d, l] for l in locals_) <= 1, f"Local_unico_medico_{m}_{d}")
 
-        # DESCRIPTION: Doctor's available location.
-        for m, p, d, h, l in comb:
-            if local_m_l[m][l] == 0:
-                prob += (x1[m, p, d, h, l] == 0, f"Local_disponivel_medico_{m}_{p}_{d}_{h}_{l}")
+        greedy_sol = self.warm_start(params, tuples)
 
-        # DESCRIPTION: Patient's available schedule.
-        for m, p, d, h, l in comb:
-            if dispon_p_d_h[p][d][h] == 0:
-                prob += (x1[m, p, d, h, l] == 0, f"Horario_disponivel_paciente_{m}_{p}_{d}_{h}_{l}")
+        for m, p, d, h, l in greedy_sol.tolist():
+            x1[m, p, d, h, l].setInitialValue(1)
 
-        # DESCRIPTION: Patient's available location.
-        for m, p, d, h, l in comb:
-            if local_p_l_d[p][l][d] == 0:
-                prob += (x1[m, p, d, h, l] == 0, f"Local_disponivel_paciente_{m}_{p}_{d}_{h}_{l}")
+            if (m, d, l) in y:
+                y[m, d, l].setInitialValue(1)
 
-        # DESCRIPTION: A doctor can only attend to one physical location per day.
-        for m in M:
-            for d in D:
-                for l1, l2 in it.combinations(L, 2):
-                    if (l1 == l2) or l1 == 0 or l2 == 0:
-                        continue
-
-                    prob += (
-                        pulp.lpSum(x1[m, p, d, h, l1] + x1[m, p, d, h, l2] for p in P for h in H) <= 1,
-                        f"Local_unico_medico_{m}_{p}_{d}_{h}_{l1}_{l2}"
-                    )
-
-        greedy_sol = list()
-        patientes_attends = [ 0 ] * len(P)
-
-        for m in M:
-            med_consults = 0
-            for d in D:
-                local_define = 0
-
-                if(med_consults >= disp_m[m]):
-                    continue
+        return prob, x1
 
-                for l in L:
-                    if(med_consults >= disp_m[m]):
-                        continue
+    def optimze(self, params: dict, start: np.ndarray | None = None) -> tuple[np.ndarray, str, float]:
+        self.stats = dict()
+        self.tuples = None
 
-                    for p in P:
-                        if(patientes_attends[p] or med_consults >= disp_m[m]):
-                            continue
+        reduced, doctors, patients = self.presolve(params)
 
-                        for h in H:
-                            if(med_consults < disp_m[m] and
-                               competencia_m_p[m][p] and
-                               dispon_p_d_h[p][d][h] and
-                               dispon_m_d_h[m][d][h] and
-                               local_m_l[m][l] and
-                               local_p_l_d[p][l][d]):
-                                greedy_sol.append([m, p, d, h, l])
-                                med_consults+=1
-                                local_define = 1
-
-                    if local_define:
-                        break
-
-        for m, p, d, h, l in greedy_sol:
-            x1[m, p, d, h, l].setInitialValue(1)
+        self.start = restrict_solution(start, doctors, patients)
+
+        solution, status, time_elapsed = self.optimze_reduced(reduced)
+
+        self.metrics.set_model(self.stats)
+
+        return (expand_solution(solution, doctors, patients), status, time_elapsed)
+
+    def presolve(self, params: dict) -> tuple[dict, np.ndarray, np.ndarray]:
+        # DESCRIPTION: Runs app.model.presolve, keeping its Inconsistência rows in self.diagnostics.
+        with self.metrics.phase("presolve"):
+            tuples = self.feasible_tuples(params)
+
+            reduced, doctors, patients, removed = presolve(params, tuples)
+
+            # INFO: Removing doctors and patients leaves the rules of the others as they were.
+            self.tuples = (reduced, restrict_solution(tuples, doctors, patients))
+
+        self.diagnostics = diagnostics(params, removed)
+        self.stats["presolve"] = {
+            "doctors": len(params['doctors']) - len(doctors),
+            "patients": len(params['patientes']) - len(patients),
+            "tightened": int((reduced['disp_m'] < np.asarray(params['disp_m'])[doctors]).sum()),
+        }
+
+        self.logger.info(
+            f"Pré-processamento removeu {self.stats['presolve']['doctors']} profissionais e {self.stats['presolve']['patients']} pacientes, "
+            f"reduziu a disponibilidade de {self.stats['presolve']['tightened']} profissionais."
+        )
+
+        return reduced, doctors, patients
+
+    def optimze_reduced(self, params: dict) -> tuple[np.ndarray, str, float]:
+        if self.decompose:
+            parts = components(params, self.feasible_tuples(params))
+
+            if len(parts) > 1:
+                return self.optimze_components(params, parts)
+
+        return self.solve(params)
+
+    def optimze_horizon(self, params: dict, weeks: int, window: int = 1) -> tuple[np.ndarray, str, float]:
+        result = rolling_horizon(self, params, weeks, window=window)
+
+        self.metrics.set_model(self.stats)
+
+        return result
+
+    def reoptimize(self, params: dict, previous_solution: np.ndarray, previous_params: dict | None = None) -> tuple[np.ndarray, str, float]:
+        # DESCRIPTION: Keeps the previous schedule where the inputs did not change and only
+        #              optimizes the doctors and patients touched by the change.
+        self.stats = dict()
+        self.start = None
+        self.tuples = None
+        self.diagnostics = list()
+
+        previous_solution = np.asarray(previous_solution, dtype=np.int64).reshape(-1, 5)
+
+        if not len(previous_solution):
+            self.logger.info("Nenhuma solução anterior encontrada, agendando do zero.")
+
+            solution, status, time_elapsed = self.optimze(params)
+            self.changes = solution_changes(params, previous_solution, solution)
+
+            return (solution, status, time_elapsed)
+
+        start = time.perf_counter()
+
+        if previous_params is None:
+            self.logger.info("Dados da execução anterior indisponíveis, todos os pacientes sem consulta serão reavaliados.")
+
+            doctor_changed, patient_changed = None, None
+        else:
+            doctor_changed, patient_changed = changed_entities(previous_params, params)
+
+            self.logger.info(f"Alterações desde a última execução: {doctor_changed.sum()} profissionais e {patient_changed.sum()} pacientes.")
+
+        # INFO: Only for the diagnostics, so an incremental run reports the same doctors and patients
+        #       left out as a full one. On the residual problem the hours taken by the kept
+        #       appointments would read as missing availability.
+        self.presolve(params)
+
+        with self.metrics.phase("presolve"):
+            fixed, residual_params, tuples, preferred = residual_problem(params, previous_solution, doctor_changed, patient_changed)
+
+        self.logger.info(f"{len(fixed)} consultas mantidas, reotimizando {len(np.unique(tuples[:, 1]))} pacientes.")
+
+        self.greedy_solution = tuples[:0]
+        status = "Optimal"
+        log = { "bound": None, "nodes": None }
+
+        if len(tuples):
+            with self.metrics.phase("build"):
+                greedy_sol = self.warm_start(residual_params, tuples)
+
+                matrix = MatrixModel(residual_params, tuples, location=self.location, weights=preference_weights(params, tuples, preferred))
+
+            self.stats.update(variables=matrix.n_columns, constraints=matrix.n_rows, nonzeros=matrix.nonzeros)
+
+            solution, status, _, log = matrix.solve(self.profile, self.time_limit(), start=greedy_sol, metrics=self.metrics, control=self.control)
+
+            if len(greedy_sol) > len(solution):
+                self.logger.info(GREEDY_KEPT_MESSAGE)
+
+                solution = greedy_sol
+                status = "Feasible"
+        else:
+            solution = tuples
+
+        solution = np.concatenate((fixed, solution))
+
+        # INFO: The weighted objective adds less than one to the count, its integer part bounds the count.
+        self.stats["objective"] = len(solution)
+        self.stats["bound"] = len(fixed) + int(np.floor(log["bound"] + 1e-6)) if log["bound"] is not None else (len(solution) if status == "Optimal" else None)
+        self.stats["gap"] = relative_gap(self.stats["objective"], self.stats["bound"])
+        self.stats["nodes"] = log["nodes"]
+        self.stats["greedy"] = len(fixed) + len(self.greedy_solution)
+
+        for violation in check_solution(params, solution):
+            self.logger.warning(violation)
+
+        self.changes = solution_changes(params, previous_solution, solution)
+
+        moved = ((self.changes[:, 1] >= 0) & (self.changes[:, 5] >= 0)).sum()
+        cancelled = (self.changes[:, 5] < 0).sum()
+        added = (self.changes[:, 1] < 0).sum()
+
+        self.stats["changes"] = { "moved": int(moved), "cancelled": int(cancelled), "added": int(added) }
+
+        self.logger.info(f"{moved} consultas remarcadas, {cancelled} canceladas e {added} novas.")
+
+        self.metrics.set_model(self.stats)
 
-        solver = pulp.PULP_CBC_CMD(msg=False, warmStart=True)
+        return (solution, status, time.perf_counter() - start)
 
-        prob.solve(solver)
+    def optimze_components(self, params: dict, parts: list[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, str, float]:
+        self.logger.info(f"Instância dividida em {len(parts)} componentes independentes.")
+
+        start = time.perf_counter()
+
+        sub_params = [ subset_params(params, doctors, patients) for doctors, patients in parts ]
+        sub_starts = [ restrict_solution(self.start, doctors, patients) for doctors, patients in parts ]
+
+        options = self.options()
+
+        # INFO: The time limit holds for the whole instance, not for each component.
+        if self.profile["time_limit"] is not None and self.deadline is None:
+            options["deadline"] = time.time() + self.profile["time_limit"]
+
+        # INFO: Starting the spawned pool costs more than it saves with a single process to start.
+        workers = min(len(parts), self.workers)
+
+        if workers > 1:
+            # INFO: The threads of the profile are the budget of the whole instance, each CBC run at the same time gets its share.
+            options["profile"] = { **self.profile, "threads": max(self.profile["threads"] // workers, 1) }
+
+            # INFO: Spawned workers do not inherit the GUI logging handlers.
+            context = multiprocessing.get_context("spawn")
+
+            # INFO: Ctrl-C reaches the whole process group, under a control the workers stop through it instead.
+            initializer = dict(initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN)) if self.control is not None else dict()
+
+            forward_progress = self.control.forward_progress(context) if self.control is not None else contextlib.nullcontext()
+
+            # INFO: The phases of each worker stay in its process, here they are all solving.
+            with self.metrics.phase("solve"), forward_progress, concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context, **initializer) as executor:
+                results = list(executor.map(solve_component, [ options ] * len(parts), sub_params, sub_starts))
+        else:
+            results = list()
+
+            for (doctors, patients), p, sub_start in zip(parts, sub_params, sub_starts):
+                model = Model(self.logger, metrics=self.metrics, **options)
+                model.start = sub_start
+                model.tuples = (p, restrict_solution(self.feasible_tuples(params), doctors, patients))
+                results.append((model.solve(p), model.stats))
+
+        solutions = list()
+        statuses = set()
+
+        for (doctors, patients), ((solution, status, _), stats) in zip(parts, results):
+            solutions.append(expand_solution(solution, doctors, patients))
+            statuses.add(status)
+
+        # INFO: Totals over the components, the bound is only known if every component has one.
+        bounds = [ stats.get("bound") for _, stats in results ]
+
+        self.stats["objective"] = sum(stats["objective"] for _, stats in results)
+        self.stats["bound"] = None if None in bounds else sum(bounds)
+        self.stats["greedy"] = sum(stats.get("greedy", 0) for _, stats in results)
+        self.stats["gap"] = relative_gap(self.stats["objective"], self.stats["bound"])
+
+        # INFO: Sizes of the models actually given to CBC, components settled without one do not count.
+        for key in ("variables", "constraints", "nonzeros"):
+            sizes = [ stats[key] for _, stats in results if stats.get(key) is not None ]
+            self.stats[key] = sum(sizes) if sizes else None
+
+        solution = np.concatenate(solutions)
+
+        # INFO: The merged result is only as good as its worst component.
+        status = "Optimal"
+
+        for candidate in ("Feasible", "Not Solved", "Undefined", "Infeasible", "Unbounded"):
+            if candidate in statuses:
+                status = candidate
+
+        for violation in check_solution(params, solution):
+            self.logger.warning(violation)
+
+        return (solution, status, time.perf_counter() - start)
+
+    def solve(self, params: dict) -> tuple[np.ndarray, str, float]:
+        if self.aggregate:
+            class_of = patient_classes(params)
+
+            if len(class_of) and class_of.max() + 1 < len(class_of):
+                return self.solve_classes(params, class_of)
+
+        return self.solve_backend(params)
+
+    def solve_classes(self, params: dict, class_of: np.ndarray) -> tuple[np.ndarray, str, float]:
+        # DESCRIPTION: Solves one patient row per class of interchangeable patients and hands the
+        #              consultations of each class back to its patients. A doctor slot still takes a
+        #              single patient, so every variable stays binary, only the patient rows change.
+        self.logger.info(f"{len(class_of)} pacientes agrupados em {class_of.max() + 1} classes intercambiáveis.")
+
+        aggregated = aggregate_params(params, class_of)
+
+        self.start = aggregate_solution(self.start, class_of)
+
+        solution, status, time_elapsed = self.solve_backend(aggregated)
+
+        solution = disaggregate_solution(solution, class_of, patient_capacity(params))
+
+        for violation in check_solution(params, solution):
+            self.logger.warning(violation)
+
+        return (solution, status, time_elapsed)
+
+    def solve_backend(self, params: dict) -> tuple[np.ndarray, str, float]:
+        if self.backend == "flow" or (self.backend == "auto" and not location_rule_binds(self.feasible_tuples(params))):
+            self.logger.info("Resolvendo com o fluxo máximo.")
+
+            with self.metrics.phase("solve"):
+                solution, status, time_elapsed = solve_flow(params, self.feasible_tuples(params))
+
+            self.stats["objective"] = len(solution)
+            self.stats["bound"] = len(solution) if status == "Optimal" else None
+            self.stats["gap"] = relative_gap(self.stats["objective"], self.stats["bound"])
+
+            for violation in check_solution(params, solution):
+                self.logger.warning(violation)
+
+            return (solution, status, time_elapsed)
+
+        return self.solve_cbc(params)
+
+    def proven_optimal(self, params: dict, tuples: np.ndarray, greedy_sol: np.ndarray) -> bool:
+        if len(greedy_sol) < upper_bound(params, tuples):
+            return False
+
+        self.logger.info("A solução inicial gulosa atinge o limitante superior, o CBC não será executado.")
+
+        return True
+
+    def solve_pulp(self, params: dict) -> tuple[np.ndarray, str, float, dict]:
+        with self.metrics.phase("build"):
+            prob, x1 = self.build(params)
+
+        if self.proven_optimal(params, self.feasible_tuples(params), self.greedy_solution):
+            return (self.greedy_solution, "Optimal", 0.0, { "bound": len(self.greedy_solution), "nodes": 0 })
+
+        self.stats.update(
+            variables=prob.numVariables(),
+            constraints=prob.numConstraints(),
+            nonzeros=sum(len(constraint) for constraint in prob.constraints.values())
+        )
+
+        # INFO: PuLP runs CBC to the end, a cancelled control only keeps it from starting.
+        if self.control is not None and self.control.cancelled:
+            return (self.greedy_solution, "Feasible", 0.0, { "bound": None, "nodes": None })
+
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, "cbc.log")
+
+            solver = pulp.PULP_CBC_CMD(
+                msg=False,
+                warmStart=True,
+                timeLimit=self.time_limit(),
+                gapRel=self.profile["gap"],
+                threads=self.profile["threads"],
+                options=[ f"randomCbcSeed {self.profile['seed']}" ],
+                logPath=log_path
+            )
+
+            # INFO: PuLP writes the MPS file inside solve, so here it counts as solving.
+            with self.metrics.phase("solve"):
+                prob.solve(solver)
+
+            with open(log_path) as f:
+                log = parse_log(f.read())
+
+        status = pulp.LpStatus[prob.status]
+
+        # INFO: Stopped by the time limit with an incumbent, it is feasible but not proven optimal.
+        if prob.sol_status == pulp.LpSolutionIntegerFeasible:
+            status = "Feasible"
 
         solution = list()
 
-        for m, p, d, h, l in comb:
-            if x1[m, p, d, h, l].varValue <= 0:
-                continue
+        if status in ("Optimal", "Feasible"):
+            for (m, p, d, h, l), variable in x1.items():
+                if not variable.varValue or variable.varValue <= 0.5:
+                    continue
+
+                solution.append([ m, p, d, h, l ])
+
+        return (np.array(solution, dtype=np.int64).reshape(-1, 5), status, prob.solutionTime, log)
+
+    def solve_matrix(self, params: dict) -> tuple[np.ndarray, str, float, dict]:
+        with self.metrics.phase("build"):
+            tuples = self.feasible_tuples(params)
+
+            greedy_sol = self.warm_start(params, tuples)
+
+            if self.proven_optimal(params, tuples, greedy_sol):
+                return (greedy_sol, "Optimal", 0.0, { "bound": len(greedy_sol), "nodes": 0 })
+
+            matrix = MatrixModel(params, tuples, location=self.location)
+
+        self.stats.update(variables=matrix.n_columns, constraints=matrix.n_rows, nonzeros=matrix.nonzeros)
+
+        return matrix.solve(self.profile, self.time_limit(), start=greedy_sol, metrics=self.metrics, control=self.control)
 
-            solution.append([ m, p, d, h, l ])
+    def solve_cbc(self, params: dict) -> tuple[np.ndarray, str, float]:
+        if self.builder == "matrix" and self.sparse:
+            solution, status, time_elapsed, log = self.solve_matrix(params)
+        else:
+            solution, status, time_elapsed, log = self.solve_pulp(params)
 
+        solution = solution.tolist()
+
+        # INFO: The warm start is always a valid schedule. CBC may stop before finding anything
+        #       or return an incumbent below it (its MIP start processing can degrade the start).
+        if len(self.greedy_solution) > len(solution):
+            self.logger.info(GREEDY_KEPT_MESSAGE)
+
+            solution = self.greedy_solution.tolist()
+            status = "Feasible"
+
+        self.stats["objective"] = len(solution)
+        self.stats["bound"] = log["bound"] if log["bound"] is not None else (len(solution) if status == "Optimal" else None)
+        self.stats["gap"] = relative_gap(self.stats["objective"], self.stats["bound"])
+        self.stats["nodes"] = log["nodes"]
+
+        for m, p, d, h, l in solution:
             self.logger.debug(f"Doctor {m} attends Patient {p} on day {d} at {h} at location {l}.")
 
-        return (np.array(solution), pulp.LpStatus[prob.status], prob.solutionTime)
+        for violation in check_solution(params, solution):
+            self.logger.warning(violation)
+
+        return (np.array(solution, dtype=np.int64).reshape(-1, 5), status, time_elapsed)
+
+def solve_component(options: dict, params: dict, start: np.ndarray | None = None) -> tuple[tuple[np.ndarray, str, float], dict]:
+    model = Model(logging.getLogger(__name__), **options)
+    model.start = start
+
+    return model.solve(params), model.stats
 
 if __name__ == "__main__":
-    import json
+    from app.benchmark.instances import random_params
 
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
@@ -167,7 +689,4 @@ if __name__ == "__main__":
 
     m = Model(logger)
 
-    with open(".ignored/example_2.json") as f:
-        data = json.load(f)
-
-        print(m.optimze(data))
+    print(m.optimze(random_params()))
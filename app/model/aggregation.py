@@ -0,0 +1,80 @@
+import numpy as np
+
+from app.model.instance import subset_params
+
+
+def patient_capacity(params: dict) -> np.ndarray:
+    # INFO: Consultations each patient row may take, one unless the row stands for a class of patients.
+    if 'patient_capacity' in params:
+        return np.asarray(params['patient_capacity']).astype(np.int64)
+
+    return np.ones(len(params['patientes']), dtype=np.int64)
+
+def patient_classes(params: dict) -> np.ndarray:
+    # DESCRIPTION: Class of each patient, patients with the same competent doctors, times and
+    #              locations are interchangeable. Classes are numbered by their first patient.
+    P = len(params['patientes'])
+
+    if not P:
+        return np.zeros(0, dtype=np.int64)
+
+    signature = np.concatenate((
+        np.asarray(params['competence_m_p']).T.reshape(P, -1) != 0,
+        np.asarray(params['dispon_p_d_h']).reshape(P, -1) != 0,
+        np.asarray(params['local_p_l_d']).reshape(P, -1) != 0,
+    ), axis=1)
+
+    _, first, inverse = np.unique(np.packbits(signature, axis=1), axis=0, return_index=True, return_inverse=True)
+
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+
+    return rank[inverse.reshape(-1)]
+
+def aggregate_params(params: dict, class_of: np.ndarray) -> dict:
+    # DESCRIPTION: One patient row per class, its first patient, that may take as many consultations as the class has patients.
+    n_classes = class_of.max(initial=-1) + 1
+
+    first = np.full(n_classes, len(class_of), dtype=np.int64)
+    np.minimum.at(first, class_of, np.arange(len(class_of)))
+
+    aggregated = subset_params(params, np.arange(len(params['doctors'])), first)
+    aggregated['patient_capacity'] = np.bincount(class_of, weights=patient_capacity(params), minlength=n_classes).astype(np.int64)
+
+    return aggregated
+
+def aggregate_solution(solution: np.ndarray | None, class_of: np.ndarray) -> np.ndarray | None:
+    if solution is None:
+        return None
+
+    solution = np.asarray(solution, dtype=np.int64).reshape(-1, 5).copy()
+    solution[:, 1] = class_of[solution[:, 1]]
+
+    return solution
+
+def disaggregate_solution(solution: np.ndarray, class_of: np.ndarray, capacity: np.ndarray | None = None) -> np.ndarray:
+    # DESCRIPTION: Gives the consultations of each class to its patients, in (m, d, h, l) order to the
+    #              patients in index order, so the same class schedule always yields the same patients.
+    solution = np.asarray(solution, dtype=np.int64).reshape(-1, 5)
+
+    if capacity is None:
+        capacity = np.ones(len(class_of), dtype=np.int64)
+
+    # INFO: A patient that may take several consultations appears once per consultation.
+    members = np.repeat(np.arange(len(class_of)), capacity)
+    members = members[np.argsort(class_of[members], kind="stable")]
+
+    offsets = np.concatenate(([ 0 ], np.cumsum(np.bincount(class_of, weights=capacity, minlength=class_of.max(initial=-1) + 1)))).astype(np.int64)
+
+    solution = solution[np.lexsort((solution[:, 4], solution[:, 3], solution[:, 2], solution[:, 0], solution[:, 1]))]
+
+    classes = solution[:, 1]
+    rank = np.arange(len(solution)) - np.searchsorted(classes, classes)
+
+    # INFO: Consultations beyond the size of the class have no patient left to take them.
+    keep = offsets[classes] + rank < offsets[classes + 1]
+
+    disaggregated = solution[keep].copy()
+    disaggregated[:, 1] = members[offsets[classes[keep]] + rank[keep]]
+
+    return disaggregated
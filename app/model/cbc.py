@@ -0,0 +1,158 @@
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+
+try:
+    import pty
+except ImportError:
+    pty = None
+
+from app.model.control import SolveControl
+
+
+# INFO: Seconds CBC gets to stop with its best solution after the first SIGINT. It only acts on
+#       it once the branch-and-bound is set up, so it is sent again every poll and then killed.
+CANCEL_GRACE = 10.0
+
+# INFO: Progress lines printed by CBC while it runs, minimization values are negative.
+PROGRESS_PATTERNS = [
+    re.compile(r"Continuous objective value is (?P<bound>\S+) - (?P<seconds>\S+) seconds"),
+    re.compile(r"Integer solution of (?P<objective>\S+) found .* and (?P<nodes>\d+) nodes \((?P<seconds>\S+) seconds\)"),
+    re.compile(
+        r"After (?P<nodes>\d+) nodes, \d+ on tree, (?P<objective>\S+) best solution, "
+        r"best possible (?P<bound>\S+) \((?P<seconds>\S+) seconds\)"
+    ),
+    re.compile(r"Search completed - best objective (?P<objective>\S+), took \d+ iterations and (?P<nodes>\d+) nodes \((?P<seconds>\S+) seconds\)"),
+]
+
+# INFO: CBC reports a missing incumbent as a huge objective.
+NO_SOLUTION = 1e49
+
+
+def parse_log(text: str) -> dict:
+    # INFO: Summary printed by CBC at the end of the branch-and-bound.
+    objective = re.search(r"^Objective value:\s+(\S+)", text, re.MULTILINE)
+    bound = re.search(r"^(?:Upper|Lower) bound:\s+(\S+)", text, re.MULTILINE)
+    nodes = re.search(r"^Enumerated nodes:\s+(\d+)", text, re.MULTILINE)
+    result = re.search(r"^Result - (.+)$", text, re.MULTILINE)
+
+    return {
+        "objective": abs(float(objective.group(1))) if objective else None,
+        "bound": abs(float(bound.group(1))) if bound else None,
+        "nodes": int(nodes.group(1)) if nodes else None,
+        "result": result.group(1).strip() if result else None,
+    }
+
+def parse_progress(line: str) -> dict:
+    for pattern in PROGRESS_PATTERNS:
+        match = pattern.search(line)
+
+        if match is None:
+            continue
+
+        values = dict()
+
+        for key, value in match.groupdict().items():
+            value = abs(float(value))
+
+            if key == "nodes":
+                values[key] = int(value)
+            elif key == "seconds" or value < NO_SOLUTION:
+                values[key] = value
+
+        return values
+
+    return dict()
+
+def run_cbc(args: list[str], log_path: str, control: SolveControl | None = None, **kwargs) -> bool:
+    # DESCRIPTION: Runs CBC with its log in log_path. Under a control its progress is reported
+    #              line by line and cancelling asks it to stop with the best solution found (SIGINT),
+    #              killing it after CANCEL_GRACE. Returns whether the run was cancelled.
+    with open(log_path, "w") as log_file:
+        if control is None:
+            subprocess.run(args, stdout=log_file, stderr=log_file, stdin=subprocess.DEVNULL, **kwargs)
+            return False
+
+        if control.cancelled:
+            return True
+
+        # INFO: Into a pipe CBC only flushes its output at the end, a terminal gets every line as it is printed.
+        if pty is not None:
+            output, terminal = pty.openpty()
+            process = subprocess.Popen(args, stdout=terminal, stderr=terminal, stdin=subprocess.DEVNULL, **kwargs)
+            os.close(terminal)
+        else:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, **kwargs)
+            output = process.stdout.fileno()
+
+        reader = threading.Thread(target=read_progress, args=(output, log_file, control), daemon=True)
+        reader.start()
+
+        cancelled_at = None
+
+        while True:
+            try:
+                process.wait(timeout=0.25)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+
+            if cancelled_at is None and control.cancelled:
+                cancelled_at = time.monotonic()
+
+            if cancelled_at is None:
+                continue
+
+            # INFO: Windows has no SIGINT for a child process, it stops without a solution.
+            if os.name == "nt" or time.monotonic() - cancelled_at > CANCEL_GRACE:
+                process.kill()
+            else:
+                process.send_signal(signal.SIGINT)
+
+        reader.join()
+
+        if pty is not None:
+            os.close(output)
+        else:
+            process.stdout.close()
+
+    return cancelled_at is not None
+
+def read_progress(output: int, log_file, control: SolveControl):
+    progress = { "objective": None, "bound": None, "gap": None, "nodes": 0, "seconds": 0.0 }
+    pending = b""
+
+    while True:
+        try:
+            chunk = os.read(output, 65536)
+        except OSError:
+            # INFO: A terminal whose process exited fails with EIO instead of returning b"".
+            break
+
+        if not chunk:
+            break
+
+        *lines, pending = (pending + chunk).split(b"\n")
+
+        for line in lines:
+            line = line.decode(errors="replace").rstrip("\r")
+            log_file.write(line + "\n")
+
+            values = parse_progress(line)
+
+            if values:
+                progress.update(values)
+                progress["gap"] = relative_gap(progress["objective"], progress["bound"])
+
+                control.progress(dict(progress))
+
+    log_file.write(pending.decode(errors="replace"))
+
+def relative_gap(objective: float | None, bound: float | None) -> float | None:
+    if objective is None or bound is None:
+        return None
+
+    return max(bound - objective, 0.0) / max(abs(bound), 1.0)
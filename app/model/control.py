@@ -0,0 +1,94 @@
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+import typing as t
+
+
+class SolveControl(object):
+
+    # DESCRIPTION: Lets the caller stop a running solve and follow the progress of CBC from another
+    #              thread. Cancelling creates a file, so a control given to the component workers
+    #              still sees it, the progress callback stays in the process that created it and
+    #              the workers send it their progress through forward_progress.
+    def __init__(self, on_progress: t.Callable[[dict], None] | None = None):
+        self.on_progress = on_progress
+        self.directory = tempfile.mkdtemp(prefix="agendador-")
+        # INFO: Queue the copies of the control in other processes put their progress in.
+        self.queue = None
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state["on_progress"] = None
+
+        return state
+
+    @property
+    def cancelled(self) -> bool:
+        return os.path.exists(os.path.join(self.directory, "cancel"))
+
+    def cancel(self):
+        # INFO: A closed control belongs to a finished solve, there is nothing left to stop.
+        if os.path.isdir(self.directory):
+            open(os.path.join(self.directory, "cancel"), "w").close()
+
+    def progress(self, progress: dict):
+        # DESCRIPTION: Called with objective, bound, gap, nodes and seconds of the CBC run going on.
+        if self.on_progress is None and self.queue is None:
+            return
+
+        # INFO: Runs on the thread reading CBC's output, which has to keep reading whatever happens.
+        try:
+            if self.on_progress is not None:
+                self.on_progress(progress)
+            else:
+                self.queue.put(progress)
+        except Exception:
+            logging.getLogger(__name__).debug("ERROR:", exc_info=True)
+
+    @contextlib.contextmanager
+    def forward_progress(self, context):
+        # DESCRIPTION: While open, the copies of this control sent to processes of the given
+        #              multiprocessing context report their progress to on_progress here.
+        if self.on_progress is None:
+            yield
+            return
+
+        # INFO: The manager process ignores Ctrl-C, the workers are stopped through the control.
+        with context.Manager() as manager:
+            self.queue = manager.Queue()
+
+            reader = threading.Thread(target=self.read_progress, args=(self.queue,), daemon=True)
+            reader.start()
+
+            try:
+                yield
+            finally:
+                self.queue.put(None)
+                reader.join()
+
+                self.queue = None
+
+    def read_progress(self, queue):
+        while (progress := queue.get()) is not None:
+            self.progress(progress)
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def progress_message(progress: dict) -> str:
+    message = f"Resolvedor em {progress['seconds']:.0f}s, {progress['nodes']} nós"
+
+    if progress["objective"] is not None:
+        message += f", melhor solução com {progress['objective']:g} consultas"
+
+    if progress["bound"] is not None:
+        message += f", limitante {progress['bound']:g}"
+
+    if progress["gap"] is not None:
+        message += f", gap de {100 * progress['gap']:.2f}%"
+
+    return message + "."
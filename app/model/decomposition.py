@@ -0,0 +1,74 @@
+import numpy as np
+
+from app.model.feasibility import feasible_tuples
+
+
+# INFO: Components smaller than this (in feasible tuples) are packed together,
+#       so tiny pieces do not pay one CBC start each.
+MIN_COMPONENT_TUPLES = 2000
+
+
+def compatibility_edges(params: dict, tuples: np.ndarray | None = None) -> np.ndarray:
+    if tuples is None:
+        tuples = feasible_tuples(params)
+
+    # INFO: A doctor and a patient compete only if they share competence, time and location.
+    return np.unique(tuples[:, :2], axis=0)
+
+def connected_components(n_doctors: int, n_patients: int, edges: np.ndarray) -> np.ndarray:
+    # INFO: Doctors are nodes [0, M), patients are nodes [M, M + P).
+    u = edges[:, 0]
+    v = edges[:, 1] + n_doctors
+
+    labels = np.arange(n_doctors + n_patients)
+
+    # INFO: Min-label propagation with pointer jumping.
+    while True:
+        new_labels = labels.copy()
+
+        np.minimum.at(new_labels, u, labels[v])
+        np.minimum.at(new_labels, v, labels[u])
+
+        new_labels = new_labels[new_labels]
+
+        if np.array_equal(new_labels, labels):
+            return labels
+
+        labels = new_labels
+
+def components(params: dict, tuples: np.ndarray | None = None, min_tuples: int = MIN_COMPONENT_TUPLES) -> list[tuple[np.ndarray, np.ndarray]]:
+    n_doctors = len(params['doctors'])
+    n_patients = len(params['patientes'])
+
+    if tuples is None:
+        tuples = feasible_tuples(params)
+
+    labels = connected_components(n_doctors, n_patients, compatibility_edges(params, tuples))
+
+    doctor_labels = labels[:n_doctors]
+    patient_labels = labels[n_doctors:]
+
+    sizes = np.bincount(doctor_labels[tuples[:, 0]], minlength=n_doctors + n_patients)
+
+    # INFO: Only components with at least one feasible tuple have something to schedule.
+    roots = np.flatnonzero(sizes)
+    roots = roots[np.argsort(-sizes[roots], kind="stable")]
+
+    parts = list()
+    pending_roots, pending_size = list(), 0
+
+    for root in roots:
+        pending_roots.append(root)
+        pending_size += sizes[root]
+
+        if pending_size >= min_tuples:
+            parts.append(pending_roots)
+            pending_roots, pending_size = list(), 0
+
+    if pending_roots:
+        parts.append(pending_roots)
+
+    return [
+        (np.flatnonzero(np.isin(doctor_labels, part)), np.flatnonzero(np.isin(patient_labels, part)))
+        for part in parts
+    ]
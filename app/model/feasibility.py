@@ -0,0 +1,92 @@
+import numpy as np
+
+
+# INFO: Upper bound of mask cells materialized at once by feasible_tuples (~64 MB of booleans).
+MAX_CHUNK_CELLS = 64 * 1024 * 1024
+
+
+def feasibility_mask(params: dict, doctors: slice = slice(None)) -> np.ndarray:
+    competence_m_p = np.asarray(params['competence_m_p'])[doctors] != 0
+    dispon_m_d_h = np.asarray(params['dispon_m_d_h'])[doctors] != 0
+    local_m_l = np.asarray(params['local_m_l'])[doctors] != 0
+    dispon_p_d_h = np.asarray(params['dispon_p_d_h']) != 0
+    local_p_d_l = np.asarray(params['local_p_l_d']).transpose(0, 2, 1) != 0
+
+    # INFO: Broadcast every rule into the (M, P, D, H, L) space.
+    return (
+        competence_m_p[:, :, None, None, None] &
+        dispon_m_d_h[:, None, :, :, None] &
+        local_m_l[:, None, None, None, :] &
+        dispon_p_d_h[None, :, :, :, None] &
+        local_p_d_l[None, :, :, None, :]
+    )
+
+def feasible_tuples(params: dict, max_chunk_cells: int = MAX_CHUNK_CELLS) -> np.ndarray:
+    n_doctors = len(params['doctors'])
+    n_cells_per_doctor = max(
+        len(params['patientes']) * len(params['days']) * len(params['hours']) * len(params['locals']), 1
+    )
+
+    chunk_size = max(max_chunk_cells // n_cells_per_doctor, 1)
+
+    chunks = list()
+
+    # INFO: Chunk over the doctors so big instances never hold the whole mask in memory.
+    for start in range(0, n_doctors, chunk_size):
+        doctors = slice(start, min(start + chunk_size, n_doctors))
+
+        tuples = np.argwhere(feasibility_mask(params, doctors))
+        tuples[:, 0] += start
+
+        chunks.append(tuples)
+
+    if not chunks:
+        return np.zeros(shape=(0, 5), dtype=np.int64)
+
+    return np.concatenate(chunks)
+
+def is_feasible(params: dict, solution: np.ndarray) -> np.ndarray:
+    solution = np.asarray(solution, dtype=np.int64).reshape(-1, 5)
+
+    m, p, d, h, l = solution.T
+
+    return (
+        (np.asarray(params['competence_m_p'])[m, p] != 0) &
+        (np.asarray(params['dispon_m_d_h'])[m, d, h] != 0) &
+        (np.asarray(params['local_m_l'])[m, l] != 0) &
+        (np.asarray(params['dispon_p_d_h'])[p, d, h] != 0) &
+        (np.asarray(params['local_p_l_d'])[p, l, d] != 0)
+    )
+
+def check_solution(params: dict, solution: np.ndarray) -> list[str]:
+    solution = np.asarray(solution, dtype=np.int64).reshape(-1, 5)
+
+    violations = list()
+
+    for m, p, d, h, l in solution[~is_feasible(params, solution)]:
+        violations.append(f"Doctor {m} cannot attend Patient {p} on day {d} at {h} at location {l}.")
+
+    # DESCRIPTION: Doctor's max availability.
+    doctors, counts = np.unique(solution[:, 0], return_counts=True)
+    for m, count in zip(doctors, counts):
+        if count > params['disp_m'][m]:
+            violations.append(f"Doctor {m} has {count} appointments, above the availability of {params['disp_m'][m]}.")
+
+    # DESCRIPTION: Doctor's just one attends in each day-hour.
+    slots, counts = np.unique(solution[:, [0, 2, 3]], axis=0, return_counts=True)
+    for (m, d, h), count in zip(slots[counts > 1], counts[counts > 1]):
+        violations.append(f"Doctor {m} has {count} appointments on day {d} at {h}.")
+
+    # DESCRIPTION: Each patient can consult a maximum of once per week.
+    patients, counts = np.unique(solution[:, 1], return_counts=True)
+    capacity = np.asarray(params.get('patient_capacity', np.ones(len(params['patientes']))))[patients]
+    for p, count in zip(patients[counts > capacity], counts[counts > capacity]):
+        violations.append(f"Patient {p} has {count} appointments.")
+
+    # DESCRIPTION: A doctor can only attend to one physical location per day.
+    physical = np.unique(solution[solution[:, 4] != 0][:, [0, 2, 4]], axis=0)
+    days, counts = np.unique(physical[:, [0, 1]], axis=0, return_counts=True)
+    for m, d in days[counts > 1]:
+        violations.append(f"Doctor {m} attends more than one physical location on day {d}.")
+
+    return violations
@@ -0,0 +1,190 @@
+import time
+
+import numpy as np
+
+from app.model.aggregation import patient_capacity
+from app.model.feasibility import feasible_tuples
+
+
+class FlowNetwork(object):
+
+    def __init__(self, n: int, tails: np.ndarray, heads: np.ndarray, caps: np.ndarray):
+        # INFO: Edge 2i is (tails[i] -> heads[i]) and 2i + 1 is its residual.
+        to = np.empty(2 * len(tails), dtype=np.int64)
+        to[0::2], to[1::2] = heads, tails
+
+        cap = np.zeros(2 * len(tails), dtype=np.int64)
+        cap[0::2] = caps
+
+        origin = np.empty(2 * len(tails), dtype=np.int64)
+        origin[0::2], origin[1::2] = tails, heads
+
+        order = np.argsort(origin, kind="stable")
+        offsets = np.concatenate(([ 0 ], np.cumsum(np.bincount(origin, minlength=n)))).tolist()
+        order = order.tolist()
+
+        self.n = n
+        self.graph = [ order[offsets[u]:offsets[u + 1]] for u in range(n) ]
+        self.to = to.tolist()
+        self.cap = cap.tolist()
+
+    def bfs(self, s: int, t: int) -> list[int] | None:
+        level = [ -1 ] * self.n
+        level[s] = 0
+
+        queue = [ s ]
+
+        for u in queue:
+            for e in self.graph[u]:
+                if self.cap[e] > 0 and level[self.to[e]] < 0:
+                    level[self.to[e]] = level[u] + 1
+                    queue.append(self.to[e])
+
+        return level if level[t] >= 0 else None
+
+    def max_flow(self, s: int, t: int) -> int:
+        graph, to, cap = self.graph, self.to, self.cap
+
+        total = 0
+
+        # DESCRIPTION: Dinic, blocking flows over the BFS level graph.
+        while (level := self.bfs(s, t)) is not None:
+            pointer = [ 0 ] * self.n
+
+            while True:
+                u, path = s, list()
+
+                while u != t:
+                    adjacency = graph[u]
+
+                    while pointer[u] < len(adjacency):
+                        e = adjacency[pointer[u]]
+
+                        if cap[e] > 0 and level[to[e]] == level[u] + 1:
+                            break
+
+                        pointer[u] += 1
+                    else:
+                        if u == s:
+                            break
+
+                        # INFO: Dead end, drop the node from this phase and step back.
+                        level[u] = -1
+                        e = path.pop()
+                        u = to[e ^ 1]
+                        pointer[u] += 1
+                        continue
+
+                    path.append(e)
+                    u = to[e]
+
+                if u != t:
+                    break
+
+                pushed = min(cap[e] for e in path)
+
+                for e in path:
+                    cap[e] -= pushed
+                    cap[e ^ 1] += pushed
+
+                total += pushed
+
+        return total
+
+def location_rule_binds(tuples: np.ndarray) -> bool:
+    physical = tuples[tuples[:, 4] != 0]
+
+    if not len(physical):
+        return False
+
+    D, L = physical[:, 2].max() + 1, physical[:, 4].max() + 1
+
+    # INFO: The rule binds when some (m, d) has feasible tuples in two physical locations.
+    m_d_l = np.unique((physical[:, 0] * D + physical[:, 2]) * L + physical[:, 4])
+
+    return bool((np.diff(m_d_l // L) == 0).any())
+
+def max_assignment(params: dict, tuples: np.ndarray) -> np.ndarray:
+    if not len(tuples):
+        return np.zeros(shape=(0, 5), dtype=np.int64)
+
+    M = len(params['doctors'])
+    P = len(params['patientes'])
+    D = len(params['days'])
+    H = len(params['hours'])
+    disp_m = np.asarray(params['disp_m'])
+
+    m, p, d, h = tuples[:, 0], tuples[:, 1], tuples[:, 2], tuples[:, 3]
+
+    # INFO: The location is irrelevant for the matching, keep the first feasible one of each (m, p, d, h).
+    #       feasible_tuples is sorted, so equal pairs are adjacent.
+    pair_keys = ((m * P + p) * D + d) * H + h
+    first = np.flatnonzero(np.concatenate(([ True ], np.diff(pair_keys) != 0)))
+
+    slot_keys = (m * D + d) * H + h
+
+    slots, slot_of_pair = np.unique(slot_keys[first], return_inverse=True)
+    slot_doctors = slots // (D * H)
+
+    patients = np.unique(p[first])
+    doctors = np.unique(slot_doctors)
+    doctors = doctors[disp_m[doctors].astype(np.int64) > 0]
+
+    # INFO: source -> patient -> doctor slot (m, d, h) -> doctor -> sink.
+    source, sink = 0, 1
+    patient_node = 2
+    slot_node = patient_node + P
+    doctor_node = slot_node + len(slots)
+
+    tails = np.concatenate((
+        np.full(len(patients), source),
+        patient_node + p[first],
+        slot_node + np.arange(len(slots)),
+        doctor_node + doctors,
+    ))
+    heads = np.concatenate((
+        patient_node + patients,
+        slot_node + slot_of_pair.reshape(-1),
+        doctor_node + slot_doctors,
+        np.full(len(doctors), sink),
+    ))
+    caps = np.concatenate((
+        patient_capacity(params)[patients],
+        np.ones(len(first) + len(slots), dtype=np.int64),
+        disp_m[doctors].astype(np.int64),
+    ))
+
+    network = FlowNetwork(doctor_node + M, tails, heads, caps)
+    network.max_flow(source, sink)
+
+    # INFO: A saturated patient -> slot edge is an appointment.
+    pair_edges = 2 * (len(patients) + np.arange(len(first)))
+    used = np.asarray(network.cap)[pair_edges] == 0
+
+    return tuples[first[used]]
+
+def solve_flow(params: dict, tuples: np.ndarray | None = None) -> tuple[np.ndarray, str, float]:
+    start = time.perf_counter()
+
+    if tuples is None:
+        tuples = feasible_tuples(params)
+
+    if not location_rule_binds(tuples):
+        return (max_assignment(params, tuples), "Optimal", time.perf_counter() - start)
+
+    # INFO: Relax the one-location-per-day rule, keep the most used physical location of
+    #       every (m, d) and solve again restricted to it, which can only be feasible.
+    relaxed = max_assignment(params, tuples)
+
+    n_days, n_locals = len(params['days']), len(params['locals'])
+
+    usage = np.zeros(shape=(len(params['doctors']), n_days, n_locals))
+    np.add.at(usage, (tuples[:, 0], tuples[:, 2], tuples[:, 4]), 1e-9)
+    np.add.at(usage, (relaxed[:, 0], relaxed[:, 2], relaxed[:, 4]), 1)
+
+    usage[:, :, 0] = -1
+    chosen = usage.argmax(axis=2)
+
+    keep = (tuples[:, 4] == 0) | (tuples[:, 4] == chosen[tuples[:, 0], tuples[:, 2]])
+
+    return (max_assignment(params, tuples[keep]), "Feasible", time.perf_counter() - start)
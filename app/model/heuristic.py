@@ -0,0 +1,181 @@
+import time
+
+import numpy as np
+
+from app.model.aggregation import aggregate_solution, disaggregate_solution
+from app.model.feasibility import feasible_tuples
+from app.model.instance import subset_params
+
+
+class Schedule(object):
+
+    def __init__(self, params: dict):
+        M = len(params['doctors'])
+        P = len(params['patientes'])
+        D = len(params['days'])
+        H = len(params['hours'])
+        L = len(params['locals'])
+
+        self.capacity = np.asarray(params['disp_m']).astype(np.int64)
+        # INFO: Patient holding each doctor slot (m, d, h), -1 when free.
+        self.occupant = np.full(shape=(M, D, H), fill_value=-1, dtype=np.int64)
+        # INFO: Physical appointments of each (m, d, l), the virtual location is never counted.
+        self.local_count = np.zeros(shape=(M, D, L), dtype=np.int64)
+        self.local_of_day = np.zeros(shape=(M, D), dtype=np.int64)
+        self.assignment = np.full(shape=(P, 5), fill_value=-1, dtype=np.int64)
+
+    def can_assign(self, candidates: np.ndarray) -> np.ndarray:
+        m, _, d, h, l = candidates.T
+
+        local_of_day = self.local_of_day[m, d]
+
+        return (
+            (self.capacity[m] > 0) &
+            (self.occupant[m, d, h] < 0) &
+            # DESCRIPTION: A doctor can only attend to one physical location per day.
+            ((l == 0) | (local_of_day == 0) | (local_of_day == l))
+        )
+
+    def assign(self, row: np.ndarray):
+        m, p, d, h, l = row.tolist()
+
+        self.capacity[m] -= 1
+        self.occupant[m, d, h] = p
+        self.assignment[p] = row
+
+        if l != 0:
+            self.local_count[m, d, l] += 1
+            self.local_of_day[m, d] = l
+
+    def unassign(self, p: int) -> np.ndarray:
+        row = self.assignment[p].copy()
+        m, _, d, h, l = row.tolist()
+
+        self.capacity[m] += 1
+        self.occupant[m, d, h] = -1
+        self.assignment[p] = -1
+
+        if l != 0:
+            self.local_count[m, d, l] -= 1
+
+            if self.local_count[m, d, l] == 0:
+                self.local_of_day[m, d] = 0
+
+        return row
+
+    def assign_first(self, candidates: np.ndarray) -> bool:
+        feasible = np.flatnonzero(self.can_assign(candidates))
+
+        if not len(feasible):
+            return False
+
+        self.assign(candidates[feasible[0]])
+
+        return True
+
+    def replay(self, rows: np.ndarray):
+        # DESCRIPTION: Assign the given appointments in order, skipping the ones that no longer fit.
+        for row in np.asarray(rows, dtype=np.int64).reshape(-1, 5):
+            if self.assignment[row[1], 0] < 0 and self.can_assign(row[None])[0]:
+                self.assign(row)
+
+    def solution(self) -> np.ndarray:
+        return self.assignment[self.assignment[:, 0] >= 0]
+
+def candidates_per_patient(params: dict, tuples: np.ndarray) -> list[np.ndarray]:
+    M, P = len(params['doctors']), len(params['patientes'])
+    D, H = len(params['days']), len(params['hours'])
+
+    # INFO: Slots wanted by fewer patients are tried first, leaving the disputed ones free.
+    slot_keys = (tuples[:, 0] * D + tuples[:, 2]) * H + tuples[:, 3]
+    patient_slots = np.unique(tuples[:, 1] * (M * D * H) + slot_keys)
+    demand = np.bincount(patient_slots % (M * D * H), minlength=M * D * H)
+
+    order = np.lexsort((tuples[:, 4], demand[slot_keys], tuples[:, 1]))
+    sorted_tuples = tuples[order]
+
+    offsets = np.searchsorted(sorted_tuples[:, 1], np.arange(P + 1))
+
+    return [ sorted_tuples[offsets[p]:offsets[p + 1]] for p in range(P) ]
+
+def relocate(schedule: Schedule, candidates: list[np.ndarray], p: int) -> bool:
+    # DESCRIPTION: Give an unassigned patient the slot of an assigned one that can move elsewhere.
+    m, _, d, h, _ = candidates[p].T
+
+    occupants = schedule.occupant[m, d, h]
+
+    for q in np.unique(occupants[occupants >= 0]).tolist():
+        row = schedule.unassign(q)
+
+        if schedule.assign_first(candidates[p][occupants == q]):
+            if schedule.assign_first(candidates[q]):
+                return True
+
+            schedule.unassign(p)
+
+        schedule.assign(row)
+
+    return False
+
+def warm_start(params: dict, tuples: np.ndarray | None = None, time_limit: float = 1.0, hint: np.ndarray | None = None) -> np.ndarray:
+    if 'patient_capacity' in params:
+        return class_warm_start(params, time_limit=time_limit, hint=hint)
+
+    start = time.perf_counter()
+
+    if tuples is None:
+        tuples = feasible_tuples(params)
+
+    schedule = Schedule(params)
+
+    if not len(tuples):
+        return schedule.solution()
+
+    # INFO: A known schedule (feasible rows of tuples) is kept and the greedy only fills around it.
+    if hint is not None:
+        schedule.replay(hint)
+
+    candidates = candidates_per_patient(params, tuples)
+
+    # INFO: Most constrained patients (fewest feasible slots) first.
+    patients = sorted((p for p in range(len(candidates)) if len(candidates[p])), key=lambda p: (len(candidates[p]), p))
+
+    for p in patients:
+        if schedule.assignment[p, 0] < 0:
+            schedule.assign_first(candidates[p])
+
+    doctors = np.unique(tuples[:, 0])
+
+    # INFO: Local search, repeated while it keeps finding room for someone. Every move
+    #       needs a doctor with spare capacity, so it stops as soon as none is left.
+    improved = True
+    while improved and time.perf_counter() - start < time_limit:
+        improved = False
+
+        if not (schedule.capacity[doctors] > 0).any():
+            break
+
+        for p in patients:
+            if schedule.assignment[p, 0] >= 0:
+                continue
+
+            if time.perf_counter() - start >= time_limit:
+                break
+
+            if relocate(schedule, candidates, p):
+                improved = True
+
+    return schedule.solution()
+
+def class_warm_start(params: dict, time_limit: float = 1.0, hint: np.ndarray | None = None) -> np.ndarray:
+    # DESCRIPTION: Greedy for patient rows that stand for several patients (see app.model.aggregation),
+    #              each row is repeated once per consultation it may take and scheduled as usual.
+    capacity = np.asarray(params['patient_capacity']).astype(np.int64)
+    copies = np.repeat(np.arange(len(capacity)), capacity)
+
+    expanded = subset_params({ k: v for k, v in params.items() if k != 'patient_capacity' }, np.arange(len(params['doctors'])), copies)
+
+    if hint is not None:
+        hint = disaggregate_solution(hint, copies)
+
+    return aggregate_solution(warm_start(expanded, time_limit=time_limit, hint=hint), copies)
@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+
+from app.model.instance import restrict_solution, subset_params
+
+
+def window_params(params: dict, size: int, patients: np.ndarray, capacity: np.ndarray) -> dict:
+    # DESCRIPTION: A window of `size` weeks as a single week instance, with one copy of
+    #              every doctor per week (copy w of doctor m is w * M + m). The patient
+    #              rows keep one consultation per patient over the whole window.
+    M = len(params['doctors'])
+
+    window = subset_params(params, np.tile(np.arange(M), size), patients)
+
+    # INFO: Only the first week of the window gets the capacity carried from the weeks before.
+    window['disp_m'] = window['disp_m'].copy()
+    window['disp_m'][:M] = capacity
+
+    return window
+
+def rolling_horizon(model, params: dict, weeks: int, window: int = 1, carry_capacity: bool = True) -> tuple[np.ndarray, str, float]:
+    # DESCRIPTION: Schedules `weeks` weeks of the same weekly availability, one window at a time.
+    #              Only the first week of each window is kept, the patients left without a
+    #              consultation move to the next one and the rest of the window warm starts it.
+    start = time.perf_counter()
+
+    M, P, D = len(params['doctors']), len(params['patientes']), len(params['days'])
+
+    disp_m = np.asarray(params['disp_m']).astype(np.int64)
+    capacity = disp_m.copy()
+    remaining = np.arange(P)
+
+    solutions = list()
+    statuses = set()
+    per_week = list()
+    hint = None
+    diagnostics = list()
+    sizes = { "variables": list(), "constraints": list(), "nonzeros": list() }
+    presolve = None
+
+    for week in range(weeks):
+        if not len(remaining):
+            per_week.append(0)
+            continue
+
+        size = min(window, weeks - week)
+
+        sub_params = window_params(params, size, remaining, capacity)
+        sub_start = restrict_solution(hint, np.arange(size * M), remaining)
+
+        solution, status, _ = model.optimze(sub_params, start=sub_start)
+        statuses.add(status)
+
+        for key, values in sizes.items():
+            if model.stats.get(key) is not None:
+                values.append(model.stats[key])
+
+        # INFO: The first window still has every patient, the ones it leaves out are left out of the horizon.
+        if week == 0:
+            diagnostics = model.diagnostics
+            presolve = model.stats.get("presolve")
+
+        solution = solution.copy()
+        solution[:, 1] = remaining[solution[:, 1]]
+
+        copy = solution[:, 0] // M
+
+        committed = solution[copy == 0].copy()
+        committed[:, 2] += week * D
+
+        # INFO: The later weeks of the window, one week earlier in the next window.
+        hint = solution[copy > 0].copy()
+        hint[:, 0] -= M
+
+        used = np.bincount(committed[:, 0], minlength=M)
+        capacity = disp_m + (capacity - used if carry_capacity else 0)
+
+        remaining = np.setdiff1d(remaining, committed[:, 1])
+
+        solutions.append(committed)
+        per_week.append(len(committed))
+
+        model.logger.info(f"Semana {week + 1} de {weeks}: {len(committed)} consultas, {len(remaining)} pacientes aguardando.")
+
+    # INFO: The merged result is only as good as its worst window.
+    status = "Optimal"
+
+    for candidate in ("Feasible", "Not Solved", "Undefined", "Infeasible", "Unbounded"):
+        if candidate in statuses:
+            status = candidate
+
+    # INFO: Each window is solved on its own, the horizon as a whole is only proven optimal by a single window.
+    if status == "Optimal" and window < weeks:
+        status = "Feasible"
+
+    solution = np.concatenate(solutions) if solutions else np.zeros(shape=(0, 5), dtype=np.int64)
+
+    model.diagnostics = diagnostics
+    model.stats = {
+        "objective": len(solution),
+        "bound": None,
+        "gap": None,
+        "weeks": per_week,
+        "presolve": presolve,
+    }
+
+    # INFO: Sizes of the models actually given to CBC, windows settled without one do not count.
+    model.stats.update({ key: sum(values) if values else None for key, values in sizes.items() })
+
+    return (solution, status, time.perf_counter() - start)
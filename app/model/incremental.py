@@ -0,0 +1,155 @@
+import numpy as np
+
+from app.model.feasibility import feasible_tuples, is_feasible
+from app.model.heuristic import Schedule
+from app.model.instance import expand_solution, subset_params
+
+
+def aligned(previous_names: dict, names: dict) -> np.ndarray:
+    # DESCRIPTION: Index in the previous instance of each name of the current one, -1 when it is new.
+    previous_index = dict()
+
+    for i, name in previous_names.items():
+        previous_index.setdefault(name, i)
+
+    return np.array([ previous_index.get(names[i], -1) for i in range(len(names)) ], dtype=np.int64)
+
+def changed_entities(previous: dict, params: dict) -> tuple[np.ndarray, np.ndarray]:
+    # DESCRIPTION: Doctors and patients whose rows differ from the previous instance, matched by name.
+    doctors = aligned(previous['doctor_names'], params['doctor_names'])
+    patients = aligned(previous['patient_names'], params['patient_names'])
+    locals_ = aligned(previous['local_names'], params['local_names'])
+
+    known_doctors = np.flatnonzero(doctors >= 0)
+    known_patients = np.flatnonzero(patients >= 0)
+    known_locals = np.flatnonzero(locals_ >= 0)
+
+    competence_m_p = np.asarray(params['competence_m_p']) != 0
+    previous_competence_m_p = np.asarray(previous['competence_m_p']) != 0
+
+    # INFO: A location that did not exist before reads as unavailable in the previous instance.
+    previous_local_m_l = np.zeros(np.shape(params['local_m_l']), dtype=bool)
+    previous_local_m_l[np.ix_(known_doctors, known_locals)] = (
+        np.asarray(previous['local_m_l'])[np.ix_(doctors[known_doctors], locals_[known_locals])] != 0
+    )
+
+    previous_local_p_l_d = np.zeros(np.shape(params['local_p_l_d']), dtype=bool)
+    previous_local_p_l_d[np.ix_(known_patients, known_locals)] = (
+        np.asarray(previous['local_p_l_d'])[np.ix_(patients[known_patients], locals_[known_locals])] != 0
+    )
+
+    doctor_changed = doctors < 0
+    doctor_changed[known_doctors] |= (
+        (np.asarray(params['disp_m'])[known_doctors] != np.asarray(previous['disp_m'])[doctors[known_doctors]]) |
+        ((np.asarray(params['dispon_m_d_h'])[known_doctors] != 0) != (np.asarray(previous['dispon_m_d_h'])[doctors[known_doctors]] != 0)).any(axis=(1, 2)) |
+        ((np.asarray(params['local_m_l'])[known_doctors] != 0) != previous_local_m_l[known_doctors]).any(axis=1) |
+        (competence_m_p[np.ix_(known_doctors, known_patients)] != previous_competence_m_p[np.ix_(doctors[known_doctors], patients[known_patients])]).any(axis=1)
+    )
+
+    patient_changed = patients < 0
+    patient_changed[known_patients] |= (
+        ((np.asarray(params['dispon_p_d_h'])[known_patients] != 0) != (np.asarray(previous['dispon_p_d_h'])[patients[known_patients]] != 0)).any(axis=(1, 2)) |
+        ((np.asarray(params['local_p_l_d'])[known_patients] != 0) != previous_local_p_l_d[known_patients]).any(axis=(1, 2)) |
+        (competence_m_p[np.ix_(known_doctors, known_patients)] != previous_competence_m_p[np.ix_(doctors[known_doctors], patients[known_patients])]).any(axis=0)
+    )
+
+    return doctor_changed, patient_changed
+
+def encode(params: dict, solution: np.ndarray) -> np.ndarray:
+    P, D, H, L = (len(params[k]) for k in ('patientes', 'days', 'hours', 'locals'))
+
+    return (((solution[:, 0] * P + solution[:, 1]) * D + solution[:, 2]) * H + solution[:, 3]) * L + solution[:, 4]
+
+def subset_tuples(params: dict, doctors: np.ndarray, patients: np.ndarray) -> np.ndarray:
+    if not len(doctors) or not len(patients):
+        return np.zeros(shape=(0, 5), dtype=np.int64)
+
+    return expand_solution(feasible_tuples(subset_params(params, doctors, patients)), doctors, patients)
+
+def residual_problem(
+        params: dict,
+        previous_solution: np.ndarray,
+        doctor_changed: np.ndarray | None,
+        patient_changed: np.ndarray | None
+    ) -> tuple[np.ndarray, dict, np.ndarray, np.ndarray]:
+    # DESCRIPTION: Splits the previous appointments into the ones kept as they are and
+    #              the subproblem left to optimize, sized by what changed.
+    M, P = len(params['doctors']), len(params['patientes'])
+
+    previous_solution = np.asarray(previous_solution, dtype=np.int64).reshape(-1, 5)
+    feasible = is_feasible(params, previous_solution)
+
+    # INFO: Without the previous instance nothing is known to be unchanged, only the
+    #       appointments themselves can be checked, and every free patient is reconsidered.
+    known = doctor_changed is not None
+    if not known:
+        doctor_changed = np.zeros(M, dtype=bool)
+        patient_changed = np.zeros(P, dtype=bool)
+
+    m, p = previous_solution[:, 0], previous_solution[:, 1]
+
+    schedule = Schedule(params)
+    schedule.replay(previous_solution[feasible & ~doctor_changed[m] & ~patient_changed[p]])
+
+    fixed = schedule.solution()
+
+    # INFO: Previous appointments that could not be kept as they are, their doctors and
+    #       patients are the ones touched by the change.
+    released = previous_solution[~np.isin(encode(params, previous_solution), encode(params, fixed))]
+
+    free_patients = schedule.assignment[:, 0] < 0
+
+    active_patients = patient_changed.copy()
+    active_patients[released[:, 1]] = True
+    active_patients &= free_patients
+
+    touched_doctors = doctor_changed.copy()
+    touched_doctors[released[:, 0]] = True
+
+    if not known:
+        active_patients = free_patients
+
+    tuples = np.concatenate((
+        # INFO: Patients touched by the change may go to any doctor ...
+        subset_tuples(params, np.arange(M), np.flatnonzero(active_patients)),
+        # INFO: ... the other free patients only to the room the change opened.
+        subset_tuples(params, np.flatnonzero(touched_doctors), np.flatnonzero(free_patients & ~active_patients)),
+    ))
+
+    # INFO: Slots, capacity and locations of the day already taken by the kept appointments.
+    tuples = tuples[schedule.can_assign(tuples)] if len(tuples) else tuples
+    tuples = tuples[np.argsort(encode(params, tuples), kind="stable")]
+
+    residual_params = dict(params)
+    residual_params['disp_m'] = schedule.capacity.copy()
+
+    preferred = previous_solution[feasible]
+    preferred = preferred[np.isin(encode(params, preferred), encode(params, tuples))]
+
+    return fixed, residual_params, tuples, preferred
+
+def preference_weights(params: dict, tuples: np.ndarray, preferred: np.ndarray) -> np.ndarray:
+    # INFO: Keeping every previous appointment is worth less than one appointment more,
+    #       so the count of appointments always comes first.
+    weights = np.ones(len(tuples))
+    weights[np.isin(encode(params, tuples), encode(params, preferred))] += 1 / (len(preferred) + 1)
+
+    return weights
+
+def solution_changes(params: dict, previous_solution: np.ndarray, solution: np.ndarray) -> np.ndarray:
+    # DESCRIPTION: [p, m, d, h, l of the previous appointment, m, d, h, l of the new one] of
+    #              every patient whose appointment changed, -1 where there is none.
+    P = len(params['patientes'])
+
+    previous_rows = np.full(shape=(P, 4), fill_value=-1, dtype=np.int64)
+    rows = np.full(shape=(P, 4), fill_value=-1, dtype=np.int64)
+
+    previous_solution = np.asarray(previous_solution, dtype=np.int64).reshape(-1, 5)
+    solution = np.asarray(solution, dtype=np.int64).reshape(-1, 5)
+
+    previous_rows[previous_solution[:, 1]] = previous_solution[:, [0, 2, 3, 4]]
+    rows[solution[:, 1]] = solution[:, [0, 2, 3, 4]]
+
+    changed = np.flatnonzero((previous_rows != rows).any(axis=1))
+
+    return np.column_stack((changed, previous_rows[changed], rows[changed]))
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def subset_params(params: dict, doctors: np.ndarray, patients: np.ndarray) -> dict:
+    doctors = np.asarray(doctors, dtype=np.int64)
+    patients = np.asarray(patients, dtype=np.int64)
+
+    sub_params = dict(params)
+
+    sub_params['doctors'] = np.arange(len(doctors))
+    sub_params['patientes'] = np.arange(len(patients))
+    sub_params['disp_m'] = np.asarray(params['disp_m'])[doctors]
+    sub_params['competence_m_p'] = np.asarray(params['competence_m_p'])[np.ix_(doctors, patients)]
+    sub_params['local_m_l'] = np.asarray(params['local_m_l'])[doctors]
+    sub_params['dispon_m_d_h'] = np.asarray(params['dispon_m_d_h'])[doctors]
+    sub_params['local_p_l_d'] = np.asarray(params['local_p_l_d'])[patients]
+    sub_params['dispon_p_d_h'] = np.asarray(params['dispon_p_d_h'])[patients]
+
+    if 'patient_capacity' in params:
+        sub_params['patient_capacity'] = np.asarray(params['patient_capacity'])[patients]
+
+    if 'doctor_names' in params:
+        sub_params['doctor_names'] = { i: params['doctor_names'][m] for i, m in enumerate(doctors.tolist()) }
+
+    if 'patient_names' in params:
+        sub_params['patient_names'] = { i: params['patient_names'][p] for i, p in enumerate(patients.tolist()) }
+
+    return sub_params
+
+def expand_solution(solution: np.ndarray, doctors: np.ndarray, patients: np.ndarray) -> np.ndarray:
+    solution = np.asarray(solution, dtype=np.int64).reshape(-1, 5).copy()
+
+    solution[:, 0] = np.asarray(doctors, dtype=np.int64)[solution[:, 0]]
+    solution[:, 1] = np.asarray(patients, dtype=np.int64)[solution[:, 1]]
+
+    return solution
+
+def restrict_solution(solution: np.ndarray | None, doctors: np.ndarray, patients: np.ndarray) -> np.ndarray | None:
+    # DESCRIPTION: Rows of the given doctors and patients, renumbered as in subset_params.
+    if solution is None:
+        return None
+
+    solution = np.asarray(solution, dtype=np.int64).reshape(-1, 5)
+
+    doctor_index = np.full(max(solution[:, 0].max(initial=-1), np.max(doctors, initial=-1)) + 1, -1, dtype=np.int64)
+    patient_index = np.full(max(solution[:, 1].max(initial=-1), np.max(patients, initial=-1)) + 1, -1, dtype=np.int64)
+
+    doctor_index[doctors] = np.arange(len(doctors))
+    patient_index[patients] = np.arange(len(patients))
+
+    restricted = solution.copy()
+    restricted[:, 0] = doctor_index[solution[:, 0]]
+    restricted[:, 1] = patient_index[solution[:, 1]]
+
+    return restricted[(restricted[:, 0] >= 0) & (restricted[:, 1] >= 0)]
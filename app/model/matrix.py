@@ -0,0 +1,299 @@
+import itertools as it
+import os
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+import pulp
+
+from app.model.aggregation import patient_capacity
+from app.metrics import Metrics
+from app.model.cbc import parse_log, run_cbc
+from app.model.control import SolveControl
+from app.model.presolve import binding_doctors, binding_slots
+
+
+MPS_CHUNK_ENTRIES = 256 * 1024
+
+class MatrixModel(object):
+
+    def __init__(self, params: dict, tuples: np.ndarray, location: str = "indicator", weights: np.ndarray | None = None):
+        P = len(params['patientes'])
+        D = len(params['days'])
+        H = len(params['hours'])
+        L = len(params['locals'])
+
+        self.tuples = tuples
+        self.shape = (P, D, H, L)
+
+        m, p, d, h, l = (tuples[:, i] for i in range(5))
+
+        self.n_x = len(tuples)
+        # INFO: Objective coefficient of each tuple, every appointment counts 1 unless told otherwise.
+        self.weights = np.ones(self.n_x) if weights is None else np.asarray(weights, dtype=float)
+
+        rows, cols, vals, rhs = list(), list(), list(), list()
+        self.n_rows = 0
+
+        def add_rows(keys: np.ndarray, columns: np.ndarray, values: np.ndarray, row_rhs) -> np.ndarray:
+            unique_keys, row_of_entry = np.unique(keys, return_inverse=True)
+
+            rows.append(self.n_rows + row_of_entry.reshape(-1))
+            cols.append(columns)
+            vals.append(values)
+            rhs.append(np.broadcast_to(np.asarray(row_rhs(unique_keys), dtype=float), unique_keys.shape))
+
+            self.n_rows += len(unique_keys)
+
+            return unique_keys
+
+        x_columns = np.arange(self.n_x)
+        ones = np.ones(self.n_x)
+
+        # DESCRIPTION: Doctor's max availability.
+        binding = np.flatnonzero(binding_doctors(params, tuples)[m])
+        add_rows(m[binding], binding, ones[binding], lambda keys: np.asarray(params['disp_m'], dtype=float)[keys])
+
+        # DESCRIPTION: Doctor's just one attends in each day-hour.
+        binding = np.flatnonzero(binding_slots(params, tuples))
+        add_rows(((m * D + d) * H + h)[binding], binding, ones[binding], lambda keys: 1)
+
+        # DESCRIPTION: Each patient can consult a maximum of once per week.
+        add_rows(p, x_columns, ones, lambda keys: patient_capacity(params)[keys])
+
+        # DESCRIPTION: A doctor can only attend to one physical location per day.
+        physical = np.flatnonzero(l != 0)
+        m_d = m * D + d
+        m_d_l = m_d * L + l
+
+        self.y_keys = np.zeros(shape=(0, 3), dtype=np.int64)
+
+        if location == "pairwise":
+            # INFO: One row per (m, d) and pair of physical locations with any variable, as in Model.build.
+            for l1, l2 in it.combinations(range(1, L), 2):
+                members = physical[(l[physical] == l1) | (l[physical] == l2)]
+
+                add_rows(m_d[members], members, np.ones(len(members)), lambda keys: 1)
+        else:
+            physical_m_d_l = np.unique(m_d_l[physical])
+            physical_m_d, counts = np.unique(physical_m_d_l // L, return_counts=True)
+
+            # INFO: Days with a single physical option do not need an indicator.
+            binding = physical[np.isin(m_d[physical], physical_m_d[counts > 1])]
+
+            y_m_d_l = np.unique(m_d_l[binding])
+            self.y_keys = np.stack((y_m_d_l // L // D, y_m_d_l // L % D, y_m_d_l % L), axis=1)
+
+            y_columns = self.n_x + np.arange(len(y_m_d_l))
+
+            # INFO: sum_p x[m, p, d, h, l] - y[m, d, l] <= 0, one row per (m, d, h, l).
+            linking_keys = add_rows(
+                m_d_l[binding] * H + h[binding], binding, np.ones(len(binding)), lambda keys: 0
+            )
+            linked = np.searchsorted(y_m_d_l, linking_keys // H)
+
+            rows.append(self.n_rows - len(linking_keys) + np.arange(len(linking_keys)))
+            cols.append(y_columns[linked])
+            vals.append(-np.ones(len(linking_keys)))
+            rhs.append(np.zeros(0))
+
+            # INFO: sum_l y[m, d, l] <= 1, one row per (m, d).
+            add_rows(y_m_d_l // L, y_columns, np.ones(len(y_m_d_l)), lambda keys: 1)
+
+        self.n_y = len(self.y_keys)
+        self.rows = np.concatenate(rows).astype(np.int64)
+        self.cols = np.concatenate(cols).astype(np.int64)
+        self.vals = np.concatenate(vals)
+        self.rhs = np.concatenate(rhs)
+
+    @property
+    def n_columns(self) -> int:
+        return self.n_x + self.n_y
+
+    @property
+    def nonzeros(self) -> int:
+        return len(self.vals)
+
+    def write_mps(self, path: str):
+        order = np.lexsort((self.rows, self.cols))
+
+        rows, cols, vals = self.rows[order], self.cols[order], self.vals[order]
+
+        # INFO: Maximizing the appointments is minimizing their negative.
+        objective = np.arange(self.n_x)
+
+        entry_cols = np.concatenate((objective, cols))
+        entry_rows = np.concatenate((np.full(self.n_x, -1), rows))
+        entry_vals = np.concatenate((-self.weights, vals))
+
+        order = np.argsort(entry_cols, kind="stable")
+        entry_cols, entry_rows, entry_vals = entry_cols[order], entry_rows[order], entry_vals[order]
+
+        with open(path, "w") as f:
+            f.write("NAME          AGENDA\n")
+            f.write("ROWS\n")
+            f.write(" N  OBJ\n")
+            f.write("\n".join(np.strings.add(" L  R", np.arange(self.n_rows).astype(str)).tolist()))
+            f.write("\nCOLUMNS\n")
+            f.write("    MARKER                 'MARKER'                 'INTORG'\n")
+
+            # INFO: Formatted in chunks so the text never holds the whole matrix at once.
+            for i in range(0, len(entry_cols), MPS_CHUNK_ENTRIES):
+                chunk = slice(i, i + MPS_CHUNK_ENTRIES)
+
+                row_names = np.where(entry_rows[chunk] < 0, "OBJ", np.strings.add("R", entry_rows[chunk].astype(str)))
+                lines = np.strings.add(np.strings.add("    C", entry_cols[chunk].astype(str)), " ")
+                lines = np.strings.add(lines, row_names)
+                values = np.where(entry_vals[chunk] > 0, " 1\n", " -1\n")
+
+                # INFO: Only the weighted objective entries need the general formatting.
+                weighted = np.flatnonzero(np.abs(entry_vals[chunk]) != 1)
+
+                if len(weighted):
+                    values = values.astype("<U24")
+                    values[weighted] = [ f" {v:.12g}\n" for v in entry_vals[chunk][weighted].tolist() ]
+
+                lines = np.strings.add(lines, values)
+
+                f.write("".join(lines.tolist()))
+
+            f.write("    MARKER                 'MARKER'                 'INTEND'\n")
+            f.write("RHS\n")
+
+            nonzero_rhs = np.flatnonzero(self.rhs != 0)
+            f.write("\n".join(
+                f"    RHS R{r} {self.rhs[r]:.12g}" for r in nonzero_rhs.tolist()
+            ))
+            f.write("\nBOUNDS\n")
+            f.write("\n".join(np.strings.add(" BV BND C", np.arange(self.n_columns).astype(str)).tolist()))
+            f.write("\nENDATA\n")
+
+    def columns_of(self, solution: np.ndarray) -> np.ndarray:
+        P, D, H, L = self.shape
+
+        def encode(t: np.ndarray) -> np.ndarray:
+            return (((t[:, 0] * P + t[:, 1]) * D + t[:, 2]) * H + t[:, 3]) * L + t[:, 4]
+
+        return np.searchsorted(encode(self.tuples), encode(np.asarray(solution, dtype=np.int64).reshape(-1, 5)))
+
+    def write_start(self, path: str, solution: np.ndarray):
+        values = np.zeros(self.n_columns)
+        values[self.columns_of(solution)] = 1
+
+        if self.n_y:
+            start = np.asarray(solution, dtype=np.int64).reshape(-1, 5)
+
+            # INFO: A location indicator is on when the start uses that (m, d, l).
+            _, D, _, L = self.shape
+
+            y_m_d_l = (self.y_keys[:, 0] * D + self.y_keys[:, 1]) * L + self.y_keys[:, 2]
+            values[self.n_x:] = np.isin(y_m_d_l, (start[:, 0] * D + start[:, 2]) * L + start[:, 4])
+
+        with open(path, "w") as f:
+            f.write("Stopped on time - objective value 0\n")
+            f.write("\n".join(
+                f"{i:>7} C{i} {v:>15g} {0:>23}" for i, v in enumerate(values.tolist())
+            ))
+            f.write("\n")
+
+    def solve(
+            self,
+            profile: dict,
+            time_limit: float | None,
+            start: np.ndarray | None = None,
+            metrics: Metrics | None = None,
+            control: SolveControl | None = None
+        ) -> tuple[np.ndarray, str, float, dict]:
+        metrics = metrics if metrics is not None else Metrics()
+
+        with tempfile.TemporaryDirectory() as directory:
+            mps_path = os.path.join(directory, "model.mps")
+            start_path = os.path.join(directory, "start.mst")
+            solution_path = os.path.join(directory, "model.sol")
+            log_path = os.path.join(directory, "cbc.log")
+
+            # INFO: Writing the files CBC reads is still building the model, only the CBC run is solving it.
+            with metrics.phase("build"):
+                self.write_mps(mps_path)
+
+                args = [ pulp.PULP_CBC_CMD().path, mps_path ]
+
+                if start is not None and len(start):
+                    self.write_start(start_path, start)
+                    args += [ "-mips", start_path ]
+
+            if time_limit is not None:
+                args += [ "-sec", str(time_limit) ]
+
+            args += [
+                "-ratio", str(profile["gap"]),
+                "-threads", str(profile["threads"]),
+                "-randomCbcSeed", str(profile["seed"]),
+                "-timeMode", "elapsed",
+                "-branch",
+                "-printingOptions", "all",
+                "-solution", solution_path,
+            ]
+
+            started = time.perf_counter()
+
+            with metrics.phase("solve"):
+                cancelled = run_cbc(args, log_path, control=control, **hidden_window())
+
+            time_elapsed = time.perf_counter() - started
+
+            with open(log_path) as f:
+                log = parse_log(f.read())
+
+            log["cancelled"] = cancelled
+
+            if not os.path.exists(solution_path):
+                return (np.zeros(shape=(0, 5), dtype=np.int64), "Not Solved", time_elapsed, log)
+
+            values, status = read_solution(solution_path, self.n_columns)
+
+        solution = self.tuples[values[:self.n_x] > 0.5] if status in ("Optimal", "Feasible") else self.tuples[:0]
+
+        return (solution, status, time_elapsed, log)
+
+def read_solution(path: str, n_columns: int) -> tuple[np.ndarray, str]:
+    values = np.zeros(n_columns)
+
+    with open(path) as f:
+        header = f.readline().split()
+
+        for line in f:
+            parts = line.split()
+
+            # INFO: Infeasible entries are flagged with a leading "**".
+            if parts and parts[0] == "**":
+                parts = parts[1:]
+
+            if len(parts) >= 3 and parts[1].startswith("C"):
+                values[int(parts[1][1:])] = float(parts[2])
+
+    # INFO: Same reading of the header as pulp's CBC interface.
+    status = {
+        "Optimal": "Optimal",
+        "Infeasible": "Infeasible",
+        "Integer": "Infeasible",
+        "Unbounded": "Unbounded",
+        "Stopped": "Not Solved",
+    }.get(header[0] if header else "", "Undefined")
+
+    if status == "Not Solved" and len(header) >= 5 and header[4] == "objective":
+        status = "Feasible"
+
+    return values, status
+
+def hidden_window() -> dict:
+    # INFO: Prevent flashing console windows when called from the GUI on Windows.
+    if os.name != "nt":
+        return dict()
+
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+    return { "startupinfo": startupinfo }
@@ -0,0 +1,137 @@
+import numpy as np
+
+from app.model.aggregation import patient_capacity
+from app.model.feasibility import feasible_tuples
+from app.model.instance import subset_params
+
+
+# INFO: Table and message of each reason an entity is left out of the model.
+REASONS = {
+    "doctor_no_hours": ("RegraProfissional", "profissionais sem horas disponíveis na semana"),
+    "doctor_no_patients": ("RegraProfissional", "profissionais sem pacientes de idade compatível"),
+    "doctor_no_overlap": ("DisponProfissional", "profissionais sem dia, horário e local em comum com um paciente compatível"),
+    "patient_no_doctor": ("IdadePaciente", "pacientes sem profissional competente para a sua idade"),
+    "patient_no_overlap": ("DisponPaciente", "pacientes sem dia, horário e local em comum com um profissional competente e disponível"),
+}
+
+# INFO: Names listed in each message, the rest only counted.
+MAX_LISTED_NAMES = 20
+
+
+def presolve(params: dict, tuples: np.ndarray | None = None) -> tuple[dict, np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    # DESCRIPTION: Instance of the doctors and patients that can take part in some appointment, with
+    #              the doctors' availability tightened to what they can actually attend. Also returns
+    #              the kept doctors and patients (as in subset_params) and the removed ones by reason.
+    disp_m = np.asarray(params['disp_m'])
+    competence_m_p = np.asarray(params['competence_m_p']) != 0
+
+    if tuples is None:
+        tuples = feasible_tuples(params)
+
+    tuples = tuples[disp_m[tuples[:, 0]] > 0]
+
+    doctors = np.unique(tuples[:, 0])
+    patients = np.unique(tuples[:, 1])
+
+    removed_doctors = np.setdiff1d(np.arange(len(params['doctors'])), doctors)
+    removed_patients = np.setdiff1d(np.arange(len(params['patientes'])), patients)
+
+    no_hours = disp_m[removed_doctors] <= 0
+    no_patients = ~no_hours & ~competence_m_p[removed_doctors].any(axis=1)
+    no_doctor = ~competence_m_p[:, removed_patients].any(axis=0)
+
+    removed = {
+        "doctor_no_hours": removed_doctors[no_hours],
+        "doctor_no_patients": removed_doctors[no_patients],
+        "doctor_no_overlap": removed_doctors[~no_hours & ~no_patients],
+        "patient_no_doctor": removed_patients[no_doctor],
+        "patient_no_overlap": removed_patients[~no_doctor],
+    }
+
+    reduced = subset_params(params, doctors, patients)
+
+    # INFO: A doctor never attends more than their distinct feasible slots, nor more than their compatible patients can take.
+    doctor_index = np.searchsorted(doctors, tuples[:, 0])
+    patient_index = np.searchsorted(patients, tuples[:, 1])
+
+    D, H = len(params['days']), len(params['hours'])
+
+    slots = np.unique(doctor_index * (D * H) + tuples[:, 2] * H + tuples[:, 3]) // (D * H)
+    pairs = np.unique(doctor_index * len(patients) + patient_index)
+
+    n_slots = np.bincount(slots, minlength=len(doctors))
+    n_patients = np.bincount(pairs // len(patients), weights=patient_capacity(reduced)[pairs % len(patients)], minlength=len(doctors)) if len(patients) else np.zeros(0)
+
+    reduced['disp_m'] = np.minimum(np.minimum(reduced['disp_m'], n_slots), n_patients)
+
+    return reduced, doctors, patients, removed
+
+def diagnostics(params: dict, removed: dict[str, np.ndarray]) -> list[dict]:
+    # DESCRIPTION: One Inconsistência row per reason with anyone left out, as Loader.warning_message writes them.
+    rows = list()
+
+    for reason, indices in removed.items():
+        if not len(indices):
+            continue
+
+        table, message = REASONS[reason]
+        names_map = params['doctor_names'] if reason.startswith("doctor") else params['patient_names']
+
+        # INFO: Repeated names come from the copies of the same doctor in a multi-week window.
+        names = list(dict.fromkeys(str(names_map[i]) for i in indices.tolist()))
+        listed = ", ".join(names[:MAX_LISTED_NAMES])
+
+        if len(names) > MAX_LISTED_NAMES:
+            listed += f" e mais {len(names) - MAX_LISTED_NAMES}"
+
+        rows.append({
+            "table": table,
+            "type": "AVISO",
+            "message": f"{len(names)} {message}, fora do agendamento: {listed}."
+        })
+
+    return rows
+
+def binding_slots(params: dict, tuples: np.ndarray) -> np.ndarray:
+    # DESCRIPTION: Tuples whose (m, d, h) row is needed. A slot only one patient can fit, who takes
+    #              a single consultation, is already limited by that patient's own row.
+    P, D, H = len(params['patientes']), len(params['days']), len(params['hours'])
+
+    if not len(tuples):
+        return np.zeros(0, dtype=bool)
+
+    slot_keys = (tuples[:, 0] * D + tuples[:, 2]) * H + tuples[:, 3]
+
+    pairs = np.unique(slot_keys * P + tuples[:, 1])
+    pair_slots, first, counts = np.unique(pairs // P, return_index=True, return_counts=True)
+
+    single = counts == 1
+    redundant = pair_slots[single][patient_capacity(params)[pairs[first[single]] % P] == 1]
+
+    return ~np.isin(slot_keys, redundant)
+
+def binding_doctors(params: dict, tuples: np.ndarray) -> np.ndarray:
+    # DESCRIPTION: Doctors whose availability is below their distinct feasible slots, the others
+    #              cannot exceed it anyway since each slot takes a single appointment.
+    D, H = len(params['days']), len(params['hours'])
+
+    slots = np.unique((tuples[:, 0] * D + tuples[:, 2]) * H + tuples[:, 3]) // (D * H)
+    n_slots = np.bincount(slots, minlength=len(params['doctors']))
+
+    return np.asarray(params['disp_m']) < n_slots
+
+def upper_bound(params: dict, tuples: np.ndarray) -> int:
+    # DESCRIPTION: No schedule attends more than the doctors can take nor more than the patients with
+    #              some feasible tuple need, a warm start reaching it is already optimal.
+    D, H = len(params['days']), len(params['hours'])
+
+    if not len(tuples):
+        return 0
+
+    slots = np.unique((tuples[:, 0] * D + tuples[:, 2]) * H + tuples[:, 3]) // (D * H)
+    n_slots = np.bincount(slots, minlength=len(params['doctors']))
+
+    doctors = np.minimum(np.asarray(params['disp_m']), n_slots).sum()
+    patients = patient_capacity(params)[np.unique(tuples[:, 1])].sum()
+
+    return int(min(doctors, patients))
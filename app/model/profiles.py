@@ -0,0 +1,30 @@
+import os
+
+
+# INFO: time_limit in seconds (None waits for optimality), gap is CBC's relative gap
+#       (ratio), threads None means one per core, seed fixes CBC's random choices.
+PROFILES = {
+    "fast": { "time_limit": 30, "gap": 0.05, "threads": None, "seed": 0 },
+    "balanced": { "time_limit": 300, "gap": 0.01, "threads": None, "seed": 0 },
+    "exact": { "time_limit": None, "gap": 0.0, "threads": None, "seed": 0 },
+}
+
+# INFO: Solving to optimality without a time limit, as before the profiles existed, the others are opt-in.
+DEFAULT_PROFILE = "exact"
+
+
+def get_profile(profile: str | dict = DEFAULT_PROFILE, **overrides) -> dict:
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown solver profile '{profile}', expected one of {', '.join(PROFILES)}.")
+
+        profile = PROFILES[profile]
+
+    profile = { **PROFILES[DEFAULT_PROFILE], **profile }
+    profile.update({ k: v for k, v in overrides.items() if v is not None })
+
+    # INFO: CBC's parallel branch-and-bound is on by default.
+    if profile["threads"] is None:
+        profile["threads"] = os.cpu_count() or 1
+
+    return profile
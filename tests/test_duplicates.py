@@ -0,0 +1,20 @@
+import pytest
+
+from app.benchmark.duplicates import legacy_duplicates, random_sheets, vectorized_duplicates
+from app.loader.Loader import Loader
+
+
+@pytest.mark.parametrize("rows, seed", [ (600, 0), (6000, 1), (6000, 2) ])
+def test_vectorized_duplicates_match_legacy(rows, seed):
+    data = random_sheets(rows, duplicates=0.05, seed=seed)
+
+    legacy_loader, loader = Loader(), Loader()
+
+    legacy = legacy_duplicates(legacy_loader, { k: v.copy() for k, v in data.items() })
+    result = vectorized_duplicates(loader, { k: v.copy() for k, v in data.items() })
+
+    for sheet_name in data:
+        assert legacy[sheet_name].equals(result[sheet_name]), sheet_name
+
+    assert loader.errors
+    assert legacy_loader.errors == loader.errors